@@ -1,9 +1,27 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import calendar
 from datetime import datetime
+from data_store import (
+    load_dataset, load_manifest, build_catalog, load_cube, load_rollup,
+    load_roster, roster_version, attach_levels
+)
+from filter_index import (
+    FILTER_DIMENSIONS, build_filter_index, select_rows, facet_counts,
+    new_view_cache, cached_view, cached_views
+)
+from shared_links import encode_filters, decode_filters, record_link, popular_links
+from query_backend import (
+    DEFAULT_BACKEND, available_backends, aggregate_frame, duckdb_aggregate, polars_aggregate_many
+)
+from cube import (
+    cube_can_answer, rollup_cube, MONTHLY_ROLLUPS, monthly_rollup, rollup_dimension, whole_months, rollup_rows
+)
+from ranking import top_k_positions
+from period_compare import COMPARISON_MODES, comparison_window, window_rows, compare_kpis, kpi_delta
 
 # In your main content, replace the title with:
 col1, col2 = st.columns([0.1, 0.9])
@@ -14,164 +32,110 @@ with col2:
 
 
 # Initialize session state for filters
+DEFAULT_FILTERS = {
+    'start_date': None,
+    'end_date': None,
+    'quarters': [],
+    'attorney_levels': [],
+    'attorneys': [],
+    'practices': [],
+    'locations': [],
+    'statuses': [],
+    'clients': []
+}
+
 if 'filters' not in st.session_state:
-    st.session_state.filters = {
-        'start_date': None,
-        'end_date': None,
-        'quarters': [],
-        'attorney_levels': [],
-        'attorneys': [],
-        'practices': [],
-        'locations': [],
-        'statuses': [],
-        'clients': []
-    }
-
-# Load data function
-@st.cache_data
-def load_data():
-    df = pd.read_csv("Test_Full_Year.csv")
-    
-    # Convert numeric columns
-    numeric_columns = [
-        'Activity quarter',
-        'Non-billable hours', 'Non-billable hours value',
-        'Billed & Unbilled hours', 'Billed & Unbilled hours value',
-        'Unbilled hours', 'Unbilled hours value',
-        'Billed hours', 'Billed hours value',
-        'Utilization rate', 'Tracked hours',
-        'User rate'
-    ]
-    
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = df[col].replace('', pd.NA)
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Convert Activity date to datetime
-    df['Activity date'] = pd.to_datetime(df['Activity date'])
-    
-    # Attorney levels mapping
-    attorney_levels = {
-        'Aaron Swerdlow': 'Senior Counsel',
-        'Aidan Toombs': 'Mid-Level Counsel',
-        'Alexander Gershen': 'Senior Counsel',
-        'Alexander Slafkosky': 'Senior Counsel',
-        'Alfred Bridi': 'Senior Counsel',
-        'Aliona Ierega': 'Mid-Level Counsel',
-        'Amy Duvanich': 'Senior Counsel',
-        'Andres Idarraga': 'Senior Counsel',
-        'Andy Baxter': 'Mid-Level Counsel',
-        'Antigone Peyton': 'Senior Counsel',
-        'Ayala Magder': 'Senior Counsel',
-        'Benjamin Golopol': 'Mid-Level Counsel',
-        'Brian Detwiler': 'Senior Counsel',
-        'Brian Elliott': 'Senior Counsel',
-        'Brian Hicks': 'Senior Counsel',
-        'Brian McEvoy': 'Senior Counsel',
-        'Brian Scherer': 'Senior Counsel',
-        'Caitlin Cunningham': 'Mid-Level Counsel',
-        'Cary Ullman': 'Senior Counsel',
-        'Channah Rose': 'Mid-Level Counsel',
-        'Charles Caliman': 'Senior Counsel',
-        'Charles Wallace': 'Senior Counsel',
-        'Chris Geyer': 'Senior Counsel',
-        'Chris Jones': 'Mid-Level Counsel',
-        'Christopher Grewe': 'Senior Counsel',
-        'Chuck Kraus': 'Senior Counsel',
-        'Corey Pedersen': 'Senior Counsel',
-        'Darren Collins (DS)': 'Document Specialist',
-        'David Lundeen': 'Senior Counsel',
-        'Derek Gilman': 'Senior Counsel',
-        'Donica Forensich': 'Mid-Level Counsel',
-        'Dori Karjian': 'Senior Counsel',
-        'Doug Mitchell': 'Senior Counsel',
-        'Elliott Gee (DS)': 'Document Specialist',
-        'Emma Thompson': 'Senior Counsel',
-        'Eric Blatt': 'Senior Counsel',
-        'Erica Shepard': 'Senior Counsel',
-        'Garrett Ordower': 'Senior Counsel',
-        'Gregory Winter': 'Senior Counsel',
-        'Hannah Valdez': 'Mid-Level Counsel',
-        'Heather Cantua': 'Mid-Level Counsel',
-        'Henry Ciocca': 'Senior Counsel',
-        'Jacqueline Post Ladha': 'Senior Counsel',
-        'James Cashel': 'Mid-Level Counsel',
-        'James Creedon': 'Senior Counsel',
-        'Jamie Wells': 'Senior Counsel',
-        'Jason Altieri': 'Senior Counsel',
-        'Jason Harrison': 'Mid-Level Counsel',
-        'Jeff Lord': 'Senior Counsel',
-        'Jeff Love': 'Senior Counsel',
-        'Jenna Geuke': 'Mid-Level Counsel',
-        'Joanne Wolforth': 'Mid-Level Counsel',
-        'John Mitnick': 'Senior Counsel',
-        'Jonathan Van Loo': 'Senior Counsel',
-        'Joseph Kiefer': 'Mid-Level Counsel',
-        'Josh Banerje': 'Mid-Level Counsel',
-        'Julie Snyder': 'Senior Counsel',
-        'Julien Apollon': 'Mid-Level Counsel',
-        'Justin McAnaney': 'Mid-Level Counsel',
-        'Katy Barreto': 'Senior Counsel',
-        'Katy Reamon': 'Mid-Level Counsel',
-        'Kimberly Griffin': 'Mid-Level Counsel',
-        'Kirby Drake': 'Senior Counsel',
-        'Kristen Dayley': 'Senior Counsel',
-        'Kristin Bohm': 'Mid-Level Counsel',
-        'Lauren Titolo': 'Mid-Level Counsel',
-        'Lindsey Altmeyer': 'Senior Counsel',
-        'M. Sidney Donica': 'Senior Counsel',
-        'Marissa Fox': 'Senior Counsel',
-        'Mary Spooner': 'Senior Counsel',
-        'Matthew Angelo': 'Senior Counsel',
-        'Matthew Dowd (DS)': 'Document Specialist',
-        'Maureen Bumgarner': 'Mid-Level Counsel',
-        'Melissa Balough': 'Senior Counsel',
-        'Melissa Clarke': 'Senior Counsel',
-        'Michael Keskey': 'Mid-Level Counsel',
-        'Michelle Maticic': 'Senior Counsel',
-        'Natasha Fedder': 'Senior Counsel',
-        'Nicole Baldocchi': 'Senior Counsel',
-        'Nora Wong': 'Mid-Level Counsel',
-        'Ornella Bourne': 'Mid-Level Counsel',
-        'Rainer Scarton': 'Mid-Level Counsel',
-        'Robert Gans': 'Senior Counsel',
-        'Robin Shofner': 'Senior Counsel',
-        'Robyn Marcello': 'Mid-Level Counsel',
-        'Sabina Schiller': 'Mid-Level Counsel',
-        'Samer Korkor': 'Senior Counsel',
-        'Sara Rau Frumkin': 'Senior Counsel',
-        'Scale LLP': 'Other',
-        'Scott Wiegand': 'Senior Counsel',
-        'Shailika Kotiya': 'Mid-Level Counsel',
-        'Shannon Straughan': 'Senior Counsel',
-        'Stephen Bosco': 'Mid-Level Counsel',
-        'Steve Forbes': 'Senior Counsel',
-        'Steve Zagami, Paralegal': 'Paralegal',
-        'Thomas Soave': 'Mid-Level Counsel',
-        'Thomas Stine': 'Senior Counsel',
-        'Tim Furin': 'Senior Counsel',
-        'Trey Calver': 'Senior Counsel',
-        'Tyler Hayden': 'Mid-Level Counsel',
-        'Whitney Joubert': 'Senior Counsel',
-        'Zach Ruby': 'Mid-Level Counsel'
-    }
-    
-    # Clean attorney names and add level
-    df['User full name (first, last)'] = df['User full name (first, last)'].str.strip()
-    df['Attorney level'] = df['User full name (first, last)'].map(attorney_levels)
-    
-    return df
+    st.session_state.filters = dict(DEFAULT_FILTERS)
+
+# Copy-on-write (always on from pandas 3) keeps the shared frames below
+# read-only: anything a page derives from it gets its own copy on write
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+def data_version():
+    # The export's fingerprint is checked on every rerun; a changed file is
+    # ingested right away and yields a new version, which keys every data cache
+    return load_manifest()['version']
 
-def create_sidebar_filters(df):
+def last_refreshed():
+    refreshed_at = datetime.fromisoformat(load_manifest()['refreshed_at'])
+    return refreshed_at.strftime('%A %b %d, %Y at %I:%M %p')
+
+@st.cache_resource(max_entries=4)
+def load_catalog(version=None, roster=0):
+    # Option lists and date bounds, built once per data and roster version
+    return build_catalog(load_manifest(), load_roster())
+
+def period_key(filters=None):
+    # Partition pruning uses the period filters chosen in the sidebar
+    filters = st.session_state.filters if filters is None else filters
+    quarters = tuple(sorted(int(q[1]) for q in filters['quarters']))
+    return filters['start_date'], filters['end_date'], quarters
+
+def link_filters(params, catalog):
+    # Complete filter state for a shared link. Values the current data no
+    # longer has are dropped and dates are clamped to the data bounds
+    min_date, max_date = (d.date() for d in catalog['bounds'])
+    filters = dict(DEFAULT_FILTERS, start_date=min_date, end_date=max_date)
+    quarters = {f'Q{q}' for q in catalog['quarters']}
+    for key, value in decode_filters(params).items():
+        if key in ('start_date', 'end_date'):
+            filters[key] = min(max(value, min_date), max_date)
+        elif key == 'quarters':
+            filters[key] = [q for q in value if q in quarters]
+        else:
+            known = set(catalog['options'][FILTER_DIMENSIONS[key]])
+            filters[key] = [v for v in value if v in known]
+    return filters
+
+def restore_link(catalog):
+    # A session opened from a shared link starts from the link's filters
+    params = {param: st.query_params.get_all(param) for param in st.query_params}
+    if not params:
+        return
+    filters = link_filters(params, catalog)
+    st.session_state.filters.update(filters)
+    min_date, max_date = (d.date() for d in catalog['bounds'])
+    record_link(encode_filters(filters, min_date, max_date))
+
+def share_filters():
+    # Mirror the filter state into the URL so the page can be shared as a link
+    min_date, max_date = (d.date() for d in load_catalog(data_version(), roster_version())['bounds'])
+    params = encode_filters(st.session_state.filters, min_date, max_date)
+    current = {param: st.query_params.get_all(param) for param in st.query_params}
+    if params != current:
+        st.query_params.from_dict(params)
+
+# Shared links opened most often, filtered ahead of time per data version
+WARM_LINKS = 8
+
+@st.cache_resource(max_entries=1)
+def warm_popular_links(version=None, roster=0):
+    # Runs once after each data refresh: the cube cells behind the most opened
+    # links go into the shared view cache, so those links open without filtering
+    catalog = load_catalog(version, roster)
+    for params in popular_links(WARM_LINKS):
+        filters = link_filters(params, catalog)
+        cube = load_shared_cube(*period_key(filters), version, roster)
+        index = load_cube_index(*period_key(filters), version, roster)
+        cached_view(shared_view_cache(), ('cube',) + filter_key(filters), lambda: filter_rows(cube, index, filters))
+    return True
+
+def create_period_filters():
     st.sidebar.header('Filters')
     
     # Time period filters
     st.sidebar.subheader('Time Period Filters')
     
-    # Date Range filter
-    min_date = df['Activity date'].min()
-    max_date = df['Activity date'].max()
+    # Date bounds and quarters come from the catalog, so the period can be
+    # chosen before any time entries are read
+    catalog = load_catalog(data_version(), roster_version())
+    min_date, max_date = (d.date() for d in catalog['bounds'])
+    
+    if 'link_restored' not in st.session_state:
+        st.session_state.link_restored = True
+        restore_link(catalog)
+    warm_popular_links(data_version(), roster_version())
     
     # Initialize default dates if not set
     if st.session_state.filters['start_date'] is None:
@@ -199,105 +163,331 @@ def create_sidebar_filters(df):
     st.session_state.filters['end_date'] = end_date
     
     # Quarter filter
-    quarters = sorted(df['Activity quarter'].dropna().unique().astype(int).tolist())
+    quarters = catalog['quarters']
+    if 'filter_quarters' not in st.session_state:
+        st.session_state.filter_quarters = st.session_state.filters['quarters']
     st.session_state.filters['quarters'] = st.sidebar.multiselect(
         'Select Quarters',
         options=[f'Q{q}' for q in quarters],
-        default=[]
+        key='filter_quarters'
     )
     
+    # Window the KPI deltas compare against
+    if 'compare_to' not in st.session_state:
+        st.session_state.compare_to = COMPARISON_MODES[0]
+    st.sidebar.radio(
+        'Compare KPIs With',
+        COMPARISON_MODES,
+        format_func=COMPARISON_LABELS.get,
+        key='compare_to'
+    )
+
+COMPARISON_LABELS = {
+    'previous': 'Previous period',
+    'last_year': 'Same period last year',
+}
+
+# Sidebar multiselects, in display order
+FILTER_LABELS = {
+    'attorney_levels': 'Attorney Levels',
+    'attorneys': 'Attorneys',
+    'practices': 'Practice Areas',
+    'locations': 'Matter Locations',
+    'statuses': 'Matter Status',
+    'clients': 'Clients',
+}
+
+def filter_selections(filters):
+    selections = {column: filters[key] for key, column in FILTER_DIMENSIONS.items()}
+    selections['Activity quarter'] = [int(q[1]) for q in filters['quarters']]
+    return selections
+
+def create_sidebar_filters():
     # Other filters
     st.sidebar.subheader('Other Filters')
     
-    # Attorney level filter
-    attorney_levels = sorted(df['Attorney level'].dropna().unique())
-    st.session_state.filters['attorney_levels'] = st.sidebar.multiselect(
-        'Attorney Levels',
-        options=attorney_levels
-    )
-    
-    # Attorney filter
-    attorneys = sorted(df['User full name (first, last)'].dropna().unique())
-    st.session_state.filters['attorneys'] = st.sidebar.multiselect(
-        'Attorneys',
-        options=attorneys
-    )
-    
-    # Practice area filter
-    practices = sorted(df['Practice area'].dropna().unique())
-    st.session_state.filters['practices'] = st.sidebar.multiselect(
-        'Practice Areas',
-        options=practices
-    )
+    # Widget state is keyed, so the current picks are known before any list
+    # is drawn and carry over when the page changes
+    filters = st.session_state.filters
+    for key in FILTER_LABELS:
+        if f'filter_{key}' not in st.session_state:
+            st.session_state[f'filter_{key}'] = filters[key]
+        filters[key] = st.session_state[f'filter_{key}']
+    
+    # Each list offers only the values that still match the other filters,
+    # with the rows and hours they cover. Picks already made stay listed.
+    # Lists keep the catalog's sorted order, so nothing is re-sorted here.
+    # The counts come from the period's cube, not the time entries
+    catalog = load_catalog(data_version(), roster_version())
+    cube_index = load_cube_index(*period_key(), data_version(), roster_version())
+    facets = facet_counts(cube_index, filter_selections(filters), filters['start_date'], filters['end_date'])
+    for key, label in FILTER_LABELS.items():
+        column = FILTER_DIMENSIONS[key]
+        counts = facets[column].reindex(catalog['options'][column], fill_value=0)
+        selected = set(filters[key])
+        options = [
+            value for value, rows in zip(counts.index, counts['rows'])
+            if rows > 0 or value in selected
+        ]
+        filters[key] = st.sidebar.multiselect(
+            label,
+            options=options,
+            format_func=lambda value, counts=counts: (
+                f"{value} ({counts.at[value, 'rows']:,} rows, {counts.at[value, 'hours']:,.1f} h)"
+            ),
+            key=f'filter_{key}'
+        )
     
-    # Location filter
-    locations = sorted(df['Matter location'].dropna().unique())
-    st.session_state.filters['locations'] = st.sidebar.multiselect(
-        'Matter Locations',
-        options=locations
-    )
+    # Query engine for the page aggregations; switching lets the two be compared.
+    # Only engines whose package imported are offered
+    backends = available_backends()
+    if len(backends) > 1:
+        if st.session_state.get('query_backend') not in backends:
+            st.session_state.query_backend = DEFAULT_BACKEND if DEFAULT_BACKEND in backends else 'pandas'
+        st.sidebar.selectbox('Query Engine', backends, key='query_backend')
     
-    # Status filter
-    statuses = sorted(df['Matter status'].dropna().unique())
-    st.session_state.filters['statuses'] = st.sidebar.multiselect(
-        'Matter Status',
-        options=statuses
-    )
-    
-    # Client filter
-    clients = sorted(df['Company name'].dropna().unique())
-    st.session_state.filters['clients'] = st.sidebar.multiselect(
-        'Clients',
-        options=clients
+    share_filters()
+
+# Memory cap for the filtered views kept in the shared cache below
+VIEW_CACHE_BYTES = 256 * 1024 * 1024
+
+@st.cache_resource
+def shared_view_cache():
+    # One LRU of filtered views per server process: the same filters on
+    # another page, or from another session, reuse the stored result
+    return new_view_cache(VIEW_CACHE_BYTES)
+
+def filter_key(filters=None):
+    # Order of selection in the widgets doesn't change the result
+    filters = st.session_state.filters if filters is None else filters
+    selections = tuple(
+        (key, tuple(sorted(filters[key]))) for key in FILTER_DIMENSIONS if key != 'quarters'
     )
+    return (data_version(), roster_version()) + period_key(filters) + selections
 
-def apply_filters(df):
-    filtered = df.copy()
-    
-    # Apply date range filter using session state
-    if st.session_state.filters['start_date'] and st.session_state.filters['end_date']:
-        filtered = filtered[
-            (filtered['Activity date'].dt.date >= st.session_state.filters['start_date']) &
-            (filtered['Activity date'].dt.date <= st.session_state.filters['end_date'])
-        ]
-    
-    # Apply other filters
-    if st.session_state.filters['quarters']:
-        selected_quarter_numbers = [int(q[1]) for q in st.session_state.filters['quarters']]
-        filtered = filtered[filtered['Activity quarter'].isin(selected_quarter_numbers)]
-    
-    if st.session_state.filters['attorney_levels']:
-        filtered = filtered[filtered['Attorney level'].isin(st.session_state.filters['attorney_levels'])]
-    
-    if st.session_state.filters['attorneys']:
-        filtered = filtered[filtered['User full name (first, last)'].isin(st.session_state.filters['attorneys'])]
-    
-    if st.session_state.filters['practices']:
-        filtered = filtered[filtered['Practice area'].isin(st.session_state.filters['practices'])]
-    
-    if st.session_state.filters['locations']:
-        filtered = filtered[filtered['Matter location'].isin(st.session_state.filters['locations'])]
-    
-    if st.session_state.filters['statuses']:
-        filtered = filtered[filtered['Matter status'].isin(st.session_state.filters['statuses'])]
-    
-    if st.session_state.filters['clients']:
-        filtered = filtered[filtered['Company name'].isin(st.session_state.filters['clients'])]
-    
-    return filtered
+def filter_rows(df, index, filters=None):
+    filters = st.session_state.filters if filters is None else filters
+    
+    # Combine the precomputed row bitmaps and take the matching rows once,
+    # instead of copying the frame and slicing it again per filter
+    rows = select_rows(index, filter_selections(filters), filters['start_date'], filters['end_date'])
+    if rows is None:
+        return df.copy(deep=False)
+    return df.iloc[rows]
+
+def filtered_rows():
+    # Time entries matching the sidebar filters, read only for measures the
+    # cube can't answer, such as the detail tables' first rates and spreads.
+    # They come through the parquet reader like the export, so narrow picks
+    # read only the row groups that can match
+    view = cached_view(shared_view_cache(), ('rows',) + filter_key(), load_selected_rows)
+    # Pages get their own shallow copy; the cached view is never written to
+    return view.copy(deep=False)
+
+def session_backend():
+    # The session's engine, or pandas when none was picked or its package
+    # isn't installed (e.g. DASHBOARD_BACKEND names a missing one)
+    backend = st.session_state.get('query_backend', 'pandas')
+    return backend if backend in available_backends() else 'pandas'
+
+def reader_selections(filters=None):
+    # Sidebar picks as predicates on stored columns for the parquet reader.
+    # Levels aren't stored, so they become the roster's attorneys at those levels
+    filters = st.session_state.filters if filters is None else filters
+    selections = {column: values for column, values in filter_selections(filters).items() if values}
+    levels = selections.pop('Attorney level', None)
+    if levels:
+        roster = load_roster()
+        attorneys = set(roster.index[roster.isin(levels)])
+        if 'User full name (first, last)' in selections:
+            attorneys &= set(selections['User full name (first, last)'])
+        selections['User full name (first, last)'] = sorted(attorneys)
+    return selections
+
+def load_selected_rows():
+    # Raw rows for the current filters, read straight from storage: only the
+    # partitions and row groups that can match are touched, and the filters
+    # are applied in the reader, so narrow picks read very little
+    start_date, end_date, quarters = period_key()
+    df = load_dataset(start_date, end_date, quarters, reader_selections())
+    return attach_levels(df, load_roster())
+
+# Cube cells of a period, held once per server process and shared by every session
+@st.cache_resource(max_entries=16)
+def load_shared_cube(start_date=None, end_date=None, quarters=(), version=None, roster=0):
+    # Attorney levels come from the roster file, attached like they are to
+    # the time entries
+    return attach_levels(load_cube(start_date, end_date, quarters), load_roster())
+
+@st.cache_resource(max_entries=16)
+def load_cube_index(start_date=None, end_date=None, quarters=(), version=None, roster=0):
+    return build_filter_index(load_shared_cube(start_date, end_date, quarters, version, roster))
+
+def filtered_cube():
+    # Cube cells matching the sidebar filters, kept in the shared view cache
+    # next to the filtered time entries
+    cube = load_shared_cube(*period_key(), data_version(), roster_version())
+    index = load_cube_index(*period_key(), data_version(), roster_version())
+    return cached_view(shared_view_cache(), ('cube',) + filter_key(), lambda: filter_rows(cube, index))
+
+def period_totals(columns):
+    # Totals of stored measures over everything the sidebar filters select
+    return filtered_cube()[columns].sum()
+
+@st.cache_resource(max_entries=8)
+def load_monthly_rollup(dimension, version=None, roster=0):
+    # Persisted monthly rollup for a dimension, read once per data version;
+    # the level rollup is rebuilt from the attorney one when the roster changes
+    return monthly_rollup(load_rollup(MONTHLY_ROLLUPS[dimension]), dimension, load_roster())
+
+def filtered_rollup(group_by, measures, where=None):
+    # Monthly rollup rows for the sidebar filters when they can answer the
+    # spec: whole months, and filters only on columns the rollup keeps
+    filters = st.session_state.filters
+    selections = filter_selections(filters)
+    dimension = rollup_dimension(group_by, measures, where, selections)
+    if dimension is None:
+        return None
+    min_date, max_date = load_catalog(data_version(), roster_version())['bounds']
+    if not whole_months(filters['start_date'], filters['end_date'], min_date, max_date):
+        return None
+    rollup = load_monthly_rollup(dimension, data_version(), roster_version())
+    return rollup_rows(rollup, selections, filters['start_date'], filters['end_date'])
+
+def aggregate(group_by, measures, where=None):
+    # One grouped aggregation over the sidebar's filters, e.g.
+    # aggregate('Company name', {'Billed hours': 'sum'}), indexed by the group
+    # keys like groupby().agg(). DuckDB and Polars run the spec over the
+    # stored partitions. `where` narrows the rows further, e.g. to the top
+    # clients of a chart. On pandas, monthly trends are read from the
+    # persisted rollups when the filters allow and specs the cube can answer
+    # roll up its cells; only the rest groups the filtered time entries
+    backend = session_backend()
+    if backend == 'duckdb':
+        filters = st.session_state.filters
+        return duckdb_aggregate(
+            filter_selections(filters), filters['start_date'], filters['end_date'],
+            group_by, measures, load_roster(), where
+        )
+    if backend == 'polars':
+        return aggregate_many({'result': (group_by, measures, where)})['result']
+    rollup = filtered_rollup(group_by, measures, where)
+    if rollup is not None:
+        return rollup_cube(rollup, group_by, measures, where)
+    if cube_can_answer(group_by, measures, where):
+        return rollup_cube(filtered_cube(), group_by, measures, where)
+    return aggregate_frame(filtered_rows(), group_by, measures, where)
+
+def aggregate_many(specs):
+    # A page's aggregations at once, as {name: (group_by, measures[, where])}.
+    # Polars plans them as one lazy query and collects them together; the
+    # other engines run them one after another
+    if session_backend() == 'polars':
+        filters = st.session_state.filters
+        return polars_aggregate_many(
+            filter_selections(filters), filters['start_date'], filters['end_date'],
+            specs, load_roster()
+        )
+    return {name: aggregate(*spec) for name, spec in specs.items()}
+
+# Everything the pages read per client, practice area and attorney. The
+# KPIs, top-N charts, rate charts and detail tables of a dimension all slice
+# this one result; the detail tables take the columns in this order. All of
+# it rolls up from the cube, so no page needs the time entries for it
+DIMENSION_MEASURES = {
+    'Company name': {
+        'Billed hours': 'sum',
+        'Billed hours value': 'sum',
+        'Matter number': 'nunique',
+        'Utilization rate': 'mean'
+    },
+    'Practice area': {
+        'Billed hours': 'sum',
+        'Billed hours value': 'sum',
+        'Matter number': 'nunique',
+        'Utilization rate': 'mean',
+        'User full name (first, last)': 'nunique'
+    },
+    'User full name (first, last)': {
+        'Billed hours': 'sum',
+        'Billed hours value': 'sum',
+        'Matter number': 'nunique',
+        'Utilization rate': 'mean',
+        'Company name': 'nunique'
+    },
+}
+
+def dimension_metrics(dimensions):
+    # {dimension: measures per value}, one grouped pass per dimension. Kept
+    # in the shared view cache per filter state and engine, so every section
+    # and every page reading a dimension reuses the same result
+    backend = session_backend()
+    keys = {('dimension', backend, dimension) + filter_key(): dimension for dimension in dimensions}
+
+    def compute(missing):
+        # Dimensions not cached yet are aggregated together
+        results = aggregate_many({keys[key]: (keys[key], DIMENSION_MEASURES[keys[key]]) for key in missing})
+        for dimension, result in results.items():
+            if dimension == 'User full name (first, last)':
+                # Each attorney's level, as attach_levels() gives it to their entries
+                result['Attorney level'] = result.index.map(load_roster())
+        return {key: results[keys[key]] for key in missing}
+
+    views = cached_views(shared_view_cache(), list(keys), compute)
+    # Pages get their own shallow copies, as with the filtered views
+    return {keys[key]: view.copy(deep=False) for key, view in views.items()}
+
+# Longest Top-N list a chart shows. Each ranking keeps this many entries and
+# every chart slices its own N from it
+TOP_K = 15
+
+def top_n(name, frame, column, n):
+    # The n rows of `frame` with the largest `column`, largest first. `name`
+    # identifies the frame, e.g. 'clients' for the client measures. The top
+    # TOP_K are selected once per filter state and engine and shared by every
+    # chart ranking that frame by that column, on any page
+    if n > TOP_K:
+        return frame.iloc[top_k_positions(frame[column].to_numpy(dtype='float64', na_value=np.nan), n)]
+    backend = session_backend()
+    key = ('ranking', backend, name, column) + filter_key()
+    ranking = cached_view(shared_view_cache(), key, lambda: frame.iloc[
+        top_k_positions(frame[column].to_numpy(dtype='float64', na_value=np.nan), TOP_K)
+    ])
+    return ranking.iloc[:n].copy(deep=False)
+
+def period_comparison(kpis):
+    # KPI values for the current filters and for the comparison window, as
+    # columns 'current' and 'previous' indexed by KPI name. Both windows are
+    # rolled up from their periods' cubes, the current one being the page's
+    # own. See compare_kpis() for the KPI specs
+    filters = st.session_state.filters
+    mode = st.session_state.get('compare_to', COMPARISON_MODES[0])
+    start_date, end_date, quarters = period_key()
+    previous = comparison_window(start_date, end_date, mode)
+    version, roster = data_version(), roster_version()
+
+    def compute():
+        selections = filter_selections(filters)
+        windows = []
+        for start, end in [(start_date, end_date), previous]:
+            cube = load_shared_cube(start, end, quarters, version, roster)
+            index = load_cube_index(start, end, quarters, version, roster)
+            windows.append((cube, window_rows(index, selections, [(start, end)])[0]))
+        values = compare_kpis(windows, kpis)
+        values.columns = ['current', 'previous']
+        return values
+
+    key = ('comparison', mode, repr(kpis)) + filter_key()
+    return cached_view(shared_view_cache(), key, compute)
 
 def main():
-    # Load data
-    df = load_data()
-    
-    # Create sidebar filters
-    create_sidebar_filters(df)
-    
-    # Apply filters
-    filtered_df = apply_filters(df)
+    # Create period filters, then the sidebar filters; everything below is
+    # read from the cube of the period they select
+    create_period_filters()
+    create_sidebar_filters()
     
     # Main page content
-    st.markdown(f"*Last refreshed: Wednesday Feb 19, 2025*")
+    st.markdown(f"*Last refreshed: {last_refreshed()}*")
     
     # Add date range note
     if st.session_state.filters['start_date'] and st.session_state.filters['end_date']:
@@ -319,50 +509,44 @@ def main():
     """)
 
     # Display key metrics
+    kpis = period_comparison({
+        'hours': ('sum', 'Billed & Unbilled hours'),
+        'billed': ('sum', 'Billed hours'),
+        'utilization': ('mean', 'Utilization rate'),
+        'revenue': ('sum', 'Billed hours value'),
+    })
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        total_billable_hours = filtered_df['Billed & Unbilled hours'].sum()
-        prev_total = total_billable_hours * 0.95
-        delta = ((total_billable_hours - prev_total) / prev_total) * 100
-        arrow = "↗️" if delta > 0 else "↘️"
+        total_billable_hours = kpis.at['hours', 'current']
         st.metric(
             "Total Billable Hours",
             f"{total_billable_hours:,.1f}",
-            f"{arrow} {delta:.1f}%"
+            kpi_delta(*kpis.loc['hours'])
         )
 
     with col2:
-        total_billed = filtered_df['Billed hours'].sum()
-        prev_billed = total_billed * 0.95
-        delta = ((total_billed - prev_billed) / prev_billed) * 100
-        arrow = "↗️" if delta > 0 else "↘️"
+        total_billed = kpis.at['billed', 'current']
         st.metric(
             "Billed Hours",
             f"{total_billed:,.1f}",
-            f"{arrow} {delta:.1f}%"
+            kpi_delta(*kpis.loc['billed'])
         )
 
     with col3:
-        avg_utilization = filtered_df['Utilization rate'].mean()
-        prev_util = avg_utilization * 0.95
-        delta = ((avg_utilization - prev_util) / prev_util) * 100
-        arrow = "↗️" if delta > 0 else "↘️"
+        avg_utilization = kpis.at['utilization', 'current']
         st.metric(
             "Average Utilization",
             f"{avg_utilization:.1f}%",
-            f"{arrow} {delta:.1f}%"
+            kpi_delta(*kpis.loc['utilization'])
         )
 
     with col4:
-        total_revenue = filtered_df['Billed hours value'].sum()
-        prev_revenue = total_revenue * 0.95
-        delta = ((total_revenue - prev_revenue) / prev_revenue) * 100
-        arrow = "↗️" if delta > 0 else "↘️"
+        total_revenue = kpis.at['revenue', 'current']
         st.metric(
             "Total Revenue",
             f"${total_revenue:,.2f}",
-            f"{arrow} {delta:.1f}%"
+            kpi_delta(*kpis.loc['revenue'])
         )
 
     # Display summary visualizations
@@ -373,11 +557,7 @@ def main():
         # Hours Distribution Pie Chart
         hours_data = pd.DataFrame({
             'Category': ['Billed Hours', 'Unbilled Hours', 'Non-billable Hours'],
-            'Hours': [
-                filtered_df['Billed hours'].sum(),
-                filtered_df['Unbilled hours'].sum(),
-                filtered_df['Non-billable hours'].sum()
-            ]
+            'Hours': period_totals(['Billed hours', 'Unbilled hours', 'Non-billable hours']).to_list()
         })
         
         fig_hours = px.pie(
@@ -391,7 +571,7 @@ def main():
 
     with col2:
         # Practice Area Revenue Distribution
-        practice_revenue = filtered_df.groupby('Practice area').agg({
+        practice_revenue = aggregate('Practice area', {
             'Billed hours value': 'sum'
         }).reset_index()
         
@@ -454,7 +634,7 @@ def main():
     # Add export functionality for raw data
     st.sidebar.markdown("---")
     if st.sidebar.button("Export Raw Data"):
-        csv = filtered_df.to_csv(index=False).encode('utf-8')
+        csv = load_selected_rows().to_csv(index=False).encode('utf-8')
         st.sidebar.download_button(
             "Download CSV",
             csv,
@@ -465,7 +645,7 @@ def main():
 
     # Display last refresh time in sidebar
     st.sidebar.markdown("---")
-    st.sidebar.markdown("*Last data refresh:*  \nWednesday Feb 19, 2025")
+    st.sidebar.markdown(f"*Last data refresh:*  \n{last_refreshed()}")
 
 if __name__ == "__main__":
     main()
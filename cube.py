@@ -0,0 +1,129 @@
+import pandas as pd
+from data_store import ROLLUP_MEASURES, CUBE_PERIODS, CUBE_DIMENSIONS, CUBE_SKETCHES
+from query_backend import measure_pairs, keyed_result
+from sketches import distinct_counts
+
+# Columns the cube can group and narrow on. Levels are attached to the cube
+# through the roster, like they are to the time entries
+CUBE_KEYS = CUBE_PERIODS + CUBE_DIMENSIONS + ['Attorney level']
+
+
+def cube_can_answer(group_by, measures, where=None):
+    # Sums of the stored measures, the mean utilization rate, entry counts
+    # and distinct counts of the cube's own columns or its sketches roll up
+    # exactly. Anything else (per entry means, spreads, first values) needs
+    # the time entries
+    keys = [group_by] if isinstance(group_by, str) else list(group_by)
+    if not set(keys) <= set(CUBE_KEYS) or not set(where or {}) <= set(CUBE_KEYS):
+        return False
+    pairs, _ = measure_pairs(measures)
+    return all(
+        (func == 'sum' and col in ROLLUP_MEASURES)
+        or (func == 'mean' and col == 'Utilization rate')
+        or func == 'size'
+        or (func == 'nunique' and (col in CUBE_KEYS or col in CUBE_SKETCHES))
+        for col, func in pairs
+    )
+
+
+def rollup_cube(cube, group_by, measures, where=None):
+    # The same result as aggregate_frame() over the matching time entries,
+    # grouped from the far fewer cube cells
+    for column, values in (where or {}).items():
+        cube = cube[cube[column].isin(values)]
+    keys = [group_by] if isinstance(group_by, str) else list(group_by)
+    pairs, nested = measure_pairs(measures)
+    grouped = cube.groupby(keys, observed=True)
+    sums = grouped[ROLLUP_MEASURES + ['Utilization count', 'Entries']].sum()
+    cells = None
+
+    result = pd.DataFrame(index=sums.index)
+    for i, (col, func) in enumerate(pairs):
+        if func == 'sum':
+            result[f"m{i}"] = sums[col]
+        elif func == 'size':
+            result[f"m{i}"] = sums['Entries']
+        elif func == 'mean':
+            # Cells with no rated entries add nothing to either side
+            result[f"m{i}"] = sums['Utilization rate'] / sums['Utilization count'].where(sums['Utilization count'] > 0)
+        elif col in CUBE_SKETCHES:
+            # Each cell's set of codes is merged into its group
+            if cells is None:
+                cells = grouped.ngroup().fillna(-1).to_numpy(dtype='int64')
+            result[f"m{i}"] = distinct_counts(cells, cube[col + " codes"].to_numpy(), len(sums))
+        else:
+            result[f"m{i}"] = grouped[col].nunique()
+    return keyed_result(result.reset_index(), group_by, pairs, nested)
+
+
+# Monthly rollup each dimension's trends can be read from. Levels aren't
+# stored: their rollup is the attorney rollup regrouped through the roster
+MONTHLY_ROLLUPS = {
+    'User full name (first, last)': 'attorney',
+    'Company name': 'client',
+    'Practice area': 'practice',
+    'Attorney level': 'attorney',
+}
+ROLLUP_PERIODS = ['Activity Year', 'Activity month', 'Month start', 'Activity quarter']
+
+
+def monthly_rollup(rollup, dimension, roster):
+    # Stored rollup rows with the period keys the trend charts group on. The
+    # attorney rollup carries each attorney's level, so level picks still apply
+    rollup = rollup.copy()
+    rollup['Month start'] = pd.to_datetime(pd.DataFrame({
+        'year': rollup['Activity Year'], 'month': rollup['Activity month'], 'day': 1
+    }))
+    rollup['Activity quarter'] = (rollup['Activity month'] - 1) // 3 + 1
+    if MONTHLY_ROLLUPS[dimension] == 'attorney':
+        rollup['Attorney level'] = rollup['User full name (first, last)'].map(roster)
+    if dimension == 'Attorney level':
+        measures = ROLLUP_MEASURES + ['Utilization count', 'Entries']
+        rollup = rollup.groupby(ROLLUP_PERIODS + [dimension])[measures].sum().reset_index()
+    return rollup
+
+
+def rollup_dimension(group_by, measures, where=None, selections=None):
+    # The dimension whose monthly rollup answers this spec, or None. The spec
+    # must group by month or year and that one dimension, with sums and the
+    # mean utilization rate only, and every filter must be one the rollup
+    # still has: its dimension, the quarter and, for attorneys, the level
+    keys = [group_by] if isinstance(group_by, str) else list(group_by)
+    dimensions = [key for key in keys if key in MONTHLY_ROLLUPS]
+    if len(dimensions) != 1:
+        return None
+    dimension = dimensions[0]
+    if not set(keys) <= {'Month start', 'Activity Year', 'Activity month', dimension}:
+        return None
+
+    filterable = {dimension, 'Activity quarter'}
+    if dimension == 'User full name (first, last)':
+        filterable.add('Attorney level')
+    filtered = {column for column, values in (selections or {}).items() if len(values)}
+    if not (filtered | set(where or {})) <= filterable:
+        return None
+
+    pairs, _ = measure_pairs(measures)
+    if not all(
+        (func == 'sum' and col in ROLLUP_MEASURES) or (func == 'mean' and col == 'Utilization rate')
+        for col, func in pairs
+    ):
+        return None
+    return dimension
+
+
+def whole_months(start_date, end_date, min_date, max_date):
+    # Monthly rows only answer a date range that starts and ends on month
+    # boundaries, or runs past the ends of the data
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    return (start.day == 1 or start <= min_date) and ((end + pd.Timedelta(days=1)).day == 1 or end >= max_date)
+
+
+def rollup_rows(rollup, selections, start_date, end_date):
+    # Rollup rows for the months in the range that match the selections
+    months = rollup['Month start']
+    rows = rollup[(months >= pd.Timestamp(start_date).to_period('M').start_time) & (months <= pd.Timestamp(end_date))]
+    for column, values in selections.items():
+        if len(values):
+            rows = rows[rows[column].isin(values)]
+    return rows
@@ -0,0 +1,735 @@
+import os
+import json
+import shutil
+import hashlib
+import operator
+import threading
+from contextlib import contextmanager
+from functools import reduce
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sketches import code_sets
+
+# File locks keep separate processes (a second server, the weekly CLI run)
+# from ingesting at once; without fcntl only this process is serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Source export and on-disk columnar cache, partitioned by activity year/month
+SOURCE_CSV = "Test_Full_Year.csv"
+ROSTER_CSV = "attorney_levels.csv"
+CACHE_DIR = "data_cache"
+DATASET_DIR = os.path.join(CACHE_DIR, "time_entries")
+MANIFEST_FILE = "_manifest.json"
+# Each ingest writes the partitions, cube and rollups into a new generation
+# directory, which the manifest then points at
+LOCK_FILE = "_ingest.lock"
+GENERATION_PREFIX = "gen-"
+ROLLUP_DIR = "_rollups"
+CUBE_DIR = "_cube"
+
+# Full ingests stream the export in chunks of this many rows, so exports
+# larger than memory can be loaded
+CHUNK_ROWS = 200_000
+
+# Days before the last stored entry that a weekly export is allowed to restate
+RESTATEMENT_DAYS = 7
+
+# Rows per parquet row group. Files are sorted by date, so each group covers
+# a few days and its statistics let narrow reads skip the rest of the month
+ROW_GROUP_ROWS = 10_000
+
+# Declared schema for the time-entry export. Every column is parsed into
+# these dtypes once per data refresh; reads from the cache never re-parse.
+# Repeated dimension strings are stored as categoricals and calendar fields
+# as small integers. Hours, dollar amounts and rates stay float64 so totals
+# and averages come out exactly as they do from the export.
+SCHEMA = {
+    'Activity day': 'Int8',
+    'Activity month': 'Int8',
+    'Activity quarter': 'Int8',
+    'Activity date': 'datetime64[ns]',
+    'Non-billable hours': 'float64',
+    'Non-billable hours value': 'float64',
+    'Billed & Unbilled hours': 'float64',
+    'Billed & Unbilled hours value': 'float64',
+    'Unbilled hours': 'float64',
+    'Unbilled hours value': 'float64',
+    'Billed hours': 'float64',
+    'Billed hours value': 'float64',
+    'Utilization rate': 'float64',
+    'Tracked hours': 'float64',
+    'Matter number': 'category',
+    'Matter description': 'category',
+    'Matter status': 'category',
+    'Contact company or full name': 'category',
+    'Practice area': 'category',
+    'Originating attorney': 'category',
+    'Matter open date': 'datetime64[ns]',
+    'Matter pending date': 'datetime64[ns]',
+    'Matter close date': 'datetime64[ns]',
+    'Billable matter': 'Int8',
+    'Client reference number': 'category',
+    'Matter location': 'category',
+    'User full name (first, last)': 'category',
+    'User yearly working days': 'Int16',
+    'User rate': 'float64',
+    'Contact full name (last, first)': 'category',
+    'Contact type': 'category',
+    'Company name': 'category',
+    'Contact title': 'category',
+    'Matter billing method': 'category',
+    'Activity Year': 'Int16',
+    'Month start': 'datetime64[ns]',
+    'Week start': 'datetime64[ns]',
+    'Quarter start': 'datetime64[ns]',
+}
+
+# Period keys derived from Activity date at ingest, so trend charts group on
+# typed dates instead of rebuilding them from year/month strings
+PERIOD_COLUMNS = {
+    'Month start': 'M',
+    'Week start': 'W',
+    'Quarter start': 'Q',
+}
+
+CATEGORY_COLUMNS = [col for col, dtype in SCHEMA.items() if dtype == 'category']
+
+# Known export formats for the date columns; parsing with an explicit format
+# avoids per-row format inference
+DATE_FORMATS = {
+    'Activity date': '%Y-%m-%d',
+    'Matter open date': '%m/%d/%Y',
+    'Matter pending date': '%m/%d/%Y',
+    'Matter close date': '%m/%d/%Y',
+}
+
+# Arrow types used while spooling streamed chunks; categories are kept as
+# plain strings until the whole export has been seen
+ARROW_TYPES = {
+    'Int8': pa.int8(),
+    'Int16': pa.int16(),
+    'float64': pa.float64(),
+    'datetime64[ns]': pa.timestamp('ns'),
+    'category': pa.string(),
+    'object': pa.string(),
+}
+SPOOL_SCHEMA = pa.schema([(col, ARROW_TYPES[dtype]) for col, dtype in SCHEMA.items()])
+
+# Monthly rollups built while the export is streamed
+ROLLUPS = {
+    'attorney': 'User full name (first, last)',
+    'client': 'Company name',
+    'practice': 'Practice area',
+}
+ROLLUP_MEASURES = [
+    'Billed hours', 'Billed hours value',
+    'Unbilled hours', 'Unbilled hours value',
+    'Non-billable hours', 'Non-billable hours value',
+    'Billed & Unbilled hours', 'Billed & Unbilled hours value',
+    'Tracked hours', 'Utilization rate'
+]
+
+# Pre-aggregated cube: additive measures per day and sidebar dimension
+# combination, stored as one file per month next to the time entries. The
+# period columns are all derived from the day, so they add no extra rows
+CUBE_PERIODS = [
+    'Activity date', 'Activity Year', 'Activity month', 'Activity quarter',
+    'Month start', 'Week start', 'Quarter start'
+]
+CUBE_DIMENSIONS = [
+    'User full name (first, last)', 'Practice area', 'Company name',
+    'Matter location', 'Matter status'
+]
+
+# Columns whose distinct values each cube cell keeps as a set of category
+# codes, so distinct counts can be merged across cells, days and months
+CUBE_SKETCHES = ['Matter number']
+
+# Recorded in the manifest; a store built with another layout is rebuilt
+CUBE_LAYOUT = {'dimensions': CUBE_DIMENSIONS, 'sketches': CUBE_SKETCHES}
+
+
+def parse_dates(values, date_format):
+    parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+
+    # Fall back to inference only for the odd value that doesn't match the format
+    missed = parsed.isna() & values.notna()
+    if missed.any():
+        parsed[missed] = pd.to_datetime(values[missed], format='mixed', errors='coerce')
+    return parsed
+
+
+def apply_schema(df):
+    # Exports are sometimes concatenated, which leaves repeated header rows behind
+    df = df[df['Activity date'] != 'Activity date']
+    df = df.dropna(subset=['Activity date'])
+
+    for col, dtype in SCHEMA.items():
+        if col in PERIOD_COLUMNS:
+            continue
+        if col not in df.columns:
+            df[col] = pd.Series(pd.NA, index=df.index, dtype='object')
+        if col == 'User full name (first, last)':
+            # Clean attorney names before they become categories
+            df[col] = df[col].str.strip()
+        if dtype.startswith('datetime64'):
+            df[col] = parse_dates(df[col], DATE_FORMATS[col])
+        elif dtype.startswith(('Int', 'float')):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        df[col] = df[col].astype(dtype)
+
+    for col, freq in PERIOD_COLUMNS.items():
+        df[col] = df['Activity date'].dt.to_period(freq).dt.start_time.astype(SCHEMA[col])
+
+    return df[list(SCHEMA)].reset_index(drop=True)
+
+
+def parse_export(path=SOURCE_CSV, skiprows=None):
+    # Read everything as text first; the schema decides the final types
+    return apply_schema(pd.read_csv(path, dtype=str, keep_default_na=True, skiprows=skiprows))
+
+
+def iter_export_chunks(path=SOURCE_CSV, chunksize=CHUNK_ROWS):
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=True, chunksize=chunksize):
+        yield apply_schema(chunk)
+
+
+def scan_export_dates(path=SOURCE_CSV):
+    # Only the date column is read, so finding the refreshed window is cheap
+    dates = pd.read_csv(path, usecols=['Activity date'], dtype=str)['Activity date']
+    return parse_dates(dates, DATE_FORMATS['Activity date'])
+
+
+# Parsed manifests, keyed by path and reused until the file changes
+_manifest_cache = {}
+
+
+def read_manifest(root=DATASET_DIR, cached=True):
+    path = os.path.join(root, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    if cached and path in _manifest_cache and _manifest_cache[path][0] == mtime:
+        return _manifest_cache[path][1]
+    with open(path) as f:
+        manifest = json.load(f)
+    _manifest_cache[path] = (mtime, manifest)
+    # Callers that modify the manifest get their own copy
+    return manifest if cached else json.loads(json.dumps(manifest))
+
+
+def write_manifest(manifest, root=DATASET_DIR):
+    # Swapped in atomically once its generation is complete. Files in a
+    # generation are never changed afterwards, so a reader still holding the
+    # previous manifest keeps reading a complete generation of its own
+    path = os.path.join(root, MANIFEST_FILE)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+_ingest_lock = threading.Lock()
+
+
+@contextmanager
+def ingest_lock(root=DATASET_DIR):
+    # One ingest at a time, across this server's sessions and other processes
+    os.makedirs(root, exist_ok=True)
+    with _ingest_lock, open(os.path.join(root, LOCK_FILE), 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def new_generation():
+    return GENERATION_PREFIX + datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+
+def generation_dir(manifest, root=DATASET_DIR):
+    # Directory holding the partitions, cube and rollups a manifest describes
+    return os.path.join(root, manifest['generation'])
+
+
+def link_generation(source_dir, target_dir):
+    # Start a new generation from the files of the current one. Files are
+    # only ever replaced, never rewritten in place, so the two generations
+    # can share them through hard links
+    for dirpath, _, names in os.walk(source_dir):
+        target = os.path.join(target_dir, os.path.relpath(dirpath, source_dir))
+        os.makedirs(target, exist_ok=True)
+        for name in names:
+            try:
+                os.link(os.path.join(dirpath, name), os.path.join(target, name))
+            except OSError:
+                shutil.copy2(os.path.join(dirpath, name), os.path.join(target, name))
+
+
+def prune_generations(root, keep):
+    # Remove everything but the manifest and the kept generations: older
+    # generations and whatever an interrupted ingest left behind
+    for name in os.listdir(root):
+        if name in keep or name in (MANIFEST_FILE, LOCK_FILE):
+            continue
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def extend_categories(categories, df):
+    # Keep category codes stable across refreshes: existing values keep their
+    # codes and values first seen in the new rows are appended at the end
+    categories = dict(categories)
+    for col in CATEGORY_COLUMNS:
+        known = categories.get(col, [])
+        seen = set(known)
+        values = df[col].dropna().unique()
+        categories[col] = known + sorted(value for value in values if value not in seen)
+    return categories
+
+
+def apply_categories(df, categories):
+    for col in CATEGORY_COLUMNS:
+        df[col] = df[col].astype(pd.CategoricalDtype(categories[col]))
+    return df
+
+
+def empty_frame(categories):
+    df = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in SCHEMA.items()})
+    return apply_categories(df, categories)
+
+
+def partition_path(key, root=DATASET_DIR):
+    return os.path.join(root, key + ".parquet")
+
+
+def cube_path(key, root=DATASET_DIR):
+    return os.path.join(root, CUBE_DIR, key + ".parquet")
+
+
+def build_cube(df):
+    # Sums per day and dimension combination, sorted by day. Means are kept
+    # as sum + count, like the rollups; rows missing a dimension keep their
+    # own cell so totals over the cube match the time entries. Sketch codes
+    # come from the store's category dictionary, so `df` must carry it
+    values = df[ROLLUP_MEASURES].astype('float64')
+    values['Utilization count'] = df['Utilization rate'].notna().astype('int64')
+    values['Entries'] = 1
+    keys = [df[col] for col in CUBE_PERIODS + CUBE_DIMENSIONS]
+    grouped = values.groupby(keys, observed=True, dropna=False)
+    cube = grouped.sum()
+    cells = grouped.ngroup().to_numpy()
+    for col in CUBE_SKETCHES:
+        cube[col + " codes"] = code_sets(cells, df[col].cat.codes.to_numpy(), len(cube))
+    return cube.reset_index()
+
+
+def write_partitions(df, manifest, root=DATASET_DIR):
+    # One file per activity year/month, sorted by date within the file, and
+    # the month's cube cells beside it
+    os.makedirs(os.path.join(root, CUBE_DIR), exist_ok=True)
+    df = df.sort_values('Activity date', kind='stable')
+    dates = df['Activity date']
+    for (year, month), part in df.groupby([dates.dt.year, dates.dt.month]):
+        key = f"{year:04d}-{month:02d}"
+        path = partition_path(key, root)
+        cube = build_cube(part)
+        part = part.copy(deep=False)
+        for col in CATEGORY_COLUMNS:
+            part[col] = part[col].cat.remove_unused_categories()
+        part.to_parquet(path + ".tmp", engine='pyarrow', index=False, row_group_size=ROW_GROUP_ROWS)
+        os.replace(path + ".tmp", path)
+        cube.to_parquet(cube_path(key, root) + ".tmp", engine='pyarrow', index=False)
+        os.replace(cube_path(key, root) + ".tmp", cube_path(key, root))
+        manifest['partitions'][key] = {
+            'year': int(year),
+            'month': int(month),
+            'rows': len(part),
+            'min_date': part['Activity date'].min().strftime('%Y-%m-%d'),
+            'max_date': part['Activity date'].max().strftime('%Y-%m-%d'),
+        }
+    return manifest
+
+
+def read_partition(key, categories, root=DATASET_DIR, predicate=None):
+    # With a predicate, row groups whose statistics rule it out are skipped
+    # and the remaining rows are filtered in the reader, before any pandas
+    # objects are built
+    df = pd.read_parquet(partition_path(key, root), engine='pyarrow', filters=predicate)
+    return apply_categories(df, categories)
+
+
+def reader_predicate(start_date=None, end_date=None, selections=None):
+    # Pyarrow expression for a date range and {column: allowed values}. A
+    # column given an empty list matches no rows
+    conditions = []
+    if start_date is not None and end_date is not None:
+        conditions.append(pc.field('Activity date') >= pa.scalar(pd.Timestamp(start_date), pa.timestamp('ns')))
+        conditions.append(pc.field('Activity date') < pa.scalar(pd.Timestamp(end_date) + pd.Timedelta(days=1), pa.timestamp('ns')))
+    for column, values in (selections or {}).items():
+        conditions.append(pc.field(column).isin(list(values)) if len(values) else pc.scalar(False))
+    return reduce(operator.and_, conditions) if conditions else None
+
+
+def rollup_chunk(df, dim):
+    # Additive monthly measures for one dimension; means are kept as sum + count
+    values = df[ROLLUP_MEASURES].astype('float64')
+    values['Utilization count'] = df['Utilization rate'].notna()
+    values['Entries'] = 1
+    keys = [df['Activity Year'], df['Activity month'], df[dim].astype(object)]
+    return values.groupby(keys).sum()
+
+
+def fold_rollups(rollups, df):
+    # Fold one chunk into the running rollups; only the rollups stay in memory
+    for name, dim in ROLLUPS.items():
+        part = rollup_chunk(df, dim)
+        if name in rollups:
+            part = pd.concat([rollups[name], part]).groupby(level=[0, 1, 2]).sum()
+        rollups[name] = part
+    return rollups
+
+
+def write_rollups(rollups, root=DATASET_DIR):
+    # Rollups live inside the dataset directory, so they are rebuilt with it
+    os.makedirs(os.path.join(root, ROLLUP_DIR), exist_ok=True)
+    for name, rollup in rollups.items():
+        path = os.path.join(root, ROLLUP_DIR, name + ".parquet")
+        rollup.reset_index().to_parquet(path + ".tmp", engine='pyarrow', index=False)
+        os.replace(path + ".tmp", path)
+
+
+def rebuild_rollups(manifest, root=DATASET_DIR):
+    # Partitions are folded one at a time, so memory stays bounded
+    rollups = {}
+    for key in sorted(manifest['partitions']):
+        rollups = fold_rollups(rollups, read_partition(key, manifest['categories'], root))
+    write_rollups(rollups, root)
+
+
+def refresh_rollups(manifest, keys, root=DATASET_DIR):
+    # Only the given year/months are refolded from their partitions; every
+    # other month keeps its stored rollup rows
+    paths = {name: os.path.join(root, ROLLUP_DIR, name + ".parquet") for name in ROLLUPS}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return rebuild_rollups(manifest, root)
+
+    rollups = {}
+    for key in sorted(keys):
+        if key in manifest['partitions']:
+            rollups = fold_rollups(rollups, read_partition(key, manifest['categories'], root))
+
+    months = [int(key[:4]) * 100 + int(key[5:7]) for key in keys]
+    for name, dim in ROLLUPS.items():
+        stored = pd.read_parquet(paths[name], engine='pyarrow')
+        stored = stored[~(stored['Activity Year'].astype(int) * 100 + stored['Activity month'].astype(int)).isin(months)]
+        parts = [stored.set_index(['Activity Year', 'Activity month', dim])]
+        if name in rollups:
+            parts.append(rollups[name])
+        rollups[name] = pd.concat(parts).sort_index()
+    write_rollups(rollups, root)
+
+
+def stream_export(source=SOURCE_CSV, root=DATASET_DIR, chunksize=CHUNK_ROWS):
+    # Full ingest that never holds the whole export: chunks are spooled into
+    # per-month files while the rollups are folded, then each month is
+    # finalized on its own with the complete category dictionary. Everything
+    # is built in a new generation; the one being served is left alone
+    generation = new_generation()
+    data_dir = os.path.join(root, generation)
+    spool_dir = os.path.join(data_dir, "_spool")
+    os.makedirs(spool_dir)
+
+    writers = {}
+    categories = {}
+    rollups = {}
+    rows = 0
+    try:
+        for chunk in iter_export_chunks(source, chunksize):
+            rows += len(chunk)
+            categories = extend_categories(categories, chunk)
+            rollups = fold_rollups(rollups, chunk)
+
+            dates = chunk['Activity date']
+            for (year, month), part in chunk.groupby([dates.dt.year, dates.dt.month]):
+                key = f"{year:04d}-{month:02d}"
+                if key not in writers:
+                    writers[key] = pq.ParquetWriter(os.path.join(spool_dir, key + ".parquet"), SPOOL_SCHEMA)
+                part = part.astype({col: object for col in CATEGORY_COLUMNS})
+                writers[key].write_table(pa.Table.from_pandas(part, schema=SPOOL_SCHEMA, preserve_index=False))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # A full build gets a freshly sorted category dictionary
+    categories = {col: sorted(values) for col, values in categories.items()}
+    manifest = {
+        'schema': SCHEMA, 'cube': CUBE_LAYOUT, 'generation': generation,
+        'categories': categories, 'partitions': {},
+    }
+    for key in sorted(writers):
+        part = pd.read_parquet(os.path.join(spool_dir, key + ".parquet"), engine='pyarrow')
+        part = part.astype({col: dtype for col, dtype in SCHEMA.items() if dtype != 'category'})
+        write_partitions(apply_categories(part, categories), manifest, data_dir)
+    shutil.rmtree(spool_dir)
+
+    write_rollups(rollups, data_dir)
+    write_manifest(record_source(manifest, source), root)
+    return rows
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def record_source(manifest, source):
+    # Remember which export produced this data version and when it was loaded
+    sha256 = content_hash(source)
+    manifest.setdefault('sources', {})[os.path.abspath(source)] = {**source_fingerprint(source), 'sha256': sha256}
+    manifest['version'] = hashlib.sha256((manifest.get('version', '') + sha256).encode()).hexdigest()[:16]
+    manifest['refreshed_at'] = datetime.now().isoformat(timespec='seconds')
+    return manifest
+
+
+def cache_is_fresh(source=SOURCE_CSV, root=DATASET_DIR, check_content=True):
+    manifest = read_manifest(root)
+    if manifest is None:
+        return False
+    if not os.path.exists(source):
+        return True
+    if (manifest.get('schema') != SCHEMA or manifest.get('cube') != CUBE_LAYOUT
+            or 'generation' not in manifest):
+        return False
+
+    known = manifest.get('sources', {}).get(os.path.abspath(source))
+    if known is None:
+        return False
+
+    # The size/mtime check runs on every rerun; the content hash is only
+    # computed when it differs, so a touched but unchanged export is not re-ingested
+    fingerprint = source_fingerprint(source)
+    if all(known[key] == value for key, value in fingerprint.items()):
+        return True
+    if not check_content or content_hash(source) != known['sha256']:
+        return False
+
+    manifest = read_manifest(root, cached=False)
+    manifest['sources'][os.path.abspath(source)].update(fingerprint)
+    write_manifest(manifest, root)
+    return True
+
+
+def ingest_export(source=SOURCE_CSV, root=DATASET_DIR, full=False, chunksize=CHUNK_ROWS):
+    # Each ingest writes a new generation and then swaps the manifest over to
+    # it. The generation being replaced is kept for readers that loaded the
+    # old manifest; older ones are removed. Callers hold ingest_lock()
+    manifest = read_manifest(root, cached=False)
+    # Stores written under an older schema, cube layout or directory layout
+    # are rebuilt rather than reused
+    if (manifest is None or manifest.get('schema') != SCHEMA or manifest.get('cube') != CUBE_LAYOUT
+            or 'generation' not in manifest or not manifest['partitions']):
+        full = True
+    keep = [manifest['generation']] if manifest and 'generation' in manifest else []
+
+    if full:
+        rows = stream_export(source, root, chunksize)
+        prune_generations(root, keep + [read_manifest(root)['generation']])
+        return {'mode': 'full', 'replaced': 0, 'appended': rows}
+
+    export_dates = scan_export_dates(source)
+    if export_dates.isna().all():
+        write_manifest(record_source(manifest, source), root)
+        return {'mode': 'incremental', 'replaced': 0, 'appended': 0}
+
+    # Everything from the cutoff onward is taken from the new export: new days
+    # after the last stored entry, plus recent days the export may have restated
+    last_stored = max(pd.Timestamp(p['max_date']) for p in manifest['partitions'].values())
+    cutoff = last_stored - pd.Timedelta(days=RESTATEMENT_DAYS)
+    cutoff = max(cutoff, export_dates.min())
+
+    # Parse only the export rows inside the refreshed window (line 0 is the header)
+    refreshed = (export_dates >= cutoff).tolist()
+    new_rows = parse_export(source, skiprows=lambda i: i > 0 and not refreshed[i - 1])
+
+    # Only the months from the cutoff's onward are read and rewritten. The
+    # cutoff's month is always read, even when its stored days all fall
+    # before the cutoff, so those days are kept when the month is rewritten
+    categories = extend_categories(manifest['categories'], new_rows)
+    affected = [key for key in manifest['partitions'] if key >= cutoff.strftime('%Y-%m')]
+    stored = pd.concat(
+        [read_partition(key, categories, generation_dir(manifest, root)) for key in affected]
+        + [empty_frame(categories)],
+        ignore_index=True
+    )
+    # Stored days from the cutoff onward are the ones the export replaces
+    history = stored[stored['Activity date'] < cutoff]
+
+    # The new generation starts as links to the current one's files, so only
+    # the affected months are written again
+    generation = new_generation()
+    data_dir = os.path.join(root, generation)
+    link_generation(generation_dir(manifest, root), data_dir)
+    for key in affected:
+        os.remove(partition_path(key, data_dir))
+        if os.path.exists(cube_path(key, data_dir)):
+            os.remove(cube_path(key, data_dir))
+        del manifest['partitions'][key]
+
+    df = pd.concat([history, apply_categories(new_rows, categories)], ignore_index=True)
+    manifest['categories'] = categories
+    write_partitions(df, manifest, data_dir)
+    # Rollups are refolded only for the months that were removed or rewritten
+    written = df['Activity date'].dt.to_period('M').unique().strftime('%Y-%m')
+    refresh_rollups(manifest, set(affected) | set(written), data_dir)
+    manifest['generation'] = generation
+    write_manifest(record_source(manifest, source), root)
+    prune_generations(root, keep + [generation])
+
+    return {'mode': 'incremental', 'replaced': len(stored) - len(history), 'appended': len(new_rows)}
+
+
+def load_manifest(source=SOURCE_CSV, root=DATASET_DIR):
+    # Ingest the export as soon as its fingerprint changes. Only the
+    # fingerprint is checked without the lock; hashing and ingesting run
+    # under it, after checking again in case another session got there first
+    if not cache_is_fresh(source, root, check_content=False):
+        with ingest_lock(root):
+            if not cache_is_fresh(source, root):
+                ingest_export(source, root)
+    return read_manifest(root)
+
+
+def select_partitions(manifest, start_date=None, end_date=None, quarters=()):
+    # Partition pruning: keep only year/months overlapping the date range and quarters
+    keys = []
+    for key, part in sorted(manifest['partitions'].items()):
+        if start_date is not None and pd.Timestamp(part['max_date']) < pd.Timestamp(start_date):
+            continue
+        if end_date is not None and pd.Timestamp(part['min_date']) > pd.Timestamp(end_date):
+            continue
+        if quarters and (part['month'] - 1) // 3 + 1 not in quarters:
+            continue
+        keys.append(key)
+    return keys
+
+
+def iter_dataset(start_date=None, end_date=None, quarters=(), selections=None,
+                 source=SOURCE_CSV, root=DATASET_DIR):
+    # Raw rows are read lazily, one pruned partition at a time. The date range
+    # and any selections are pushed down into the parquet reader
+    manifest = load_manifest(source, root)
+    predicate = reader_predicate(start_date, end_date, selections)
+    for key in select_partitions(manifest, start_date, end_date, quarters):
+        yield read_partition(key, manifest['categories'], generation_dir(manifest, root), predicate)
+
+
+def load_dataset(start_date=None, end_date=None, quarters=(), selections=None,
+                 source=SOURCE_CSV, root=DATASET_DIR):
+    # Partitions are read in year/month order and each file is sorted by date,
+    # so the combined frame is ordered by activity date
+    frames = list(iter_dataset(start_date, end_date, quarters, selections, source, root))
+    if not frames:
+        return empty_frame(load_manifest(source, root)['categories'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_cube(start_date=None, end_date=None, quarters=(), source=SOURCE_CSV, root=DATASET_DIR):
+    # Cube cells of the pruned months, in day order. Only the date range is
+    # pushed down; the sidebar selections are applied by the caller
+    manifest = load_manifest(source, root)
+    predicate = reader_predicate(start_date, end_date)
+    frames = [
+        pd.read_parquet(cube_path(key, generation_dir(manifest, root)), engine='pyarrow', filters=predicate)
+        for key in select_partitions(manifest, start_date, end_date, quarters)
+    ]
+    if not frames:
+        frames = [build_cube(empty_frame(manifest['categories']))]
+    cube = pd.concat(frames, ignore_index=True)
+    for col in CUBE_DIMENSIONS:
+        cube[col] = cube[col].astype(pd.CategoricalDtype(manifest['categories'][col]))
+    return cube
+
+
+def load_rollup(name, source=SOURCE_CSV, root=DATASET_DIR):
+    data_dir = generation_dir(load_manifest(source, root), root)
+    return pd.read_parquet(os.path.join(data_dir, ROLLUP_DIR, name + ".parquet"), engine='pyarrow')
+
+
+def roster_version(path=ROSTER_CSV):
+    # Changes whenever the roster file is edited, so only the level column is rebuilt
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+
+
+def load_roster(path=ROSTER_CSV):
+    # Attorney -> level reference table, kept outside the code and the fact data
+    roster = pd.read_csv(path, dtype=str).dropna()
+    roster['Attorney'] = roster['Attorney'].str.strip()
+    return roster.drop_duplicates('Attorney', keep='last').set_index('Attorney')['Level']
+
+
+def attach_levels(df, roster):
+    # Join the roster through the attorney category codes: each distinct
+    # attorney is looked up once and rows just take their level by code
+    names = df['User full name (first, last)']
+    level_dtype = pd.CategoricalDtype(sorted(roster.unique()))
+    category_levels = level_dtype.categories.get_indexer(roster.reindex(names.cat.categories))
+    codes = names.cat.codes.to_numpy()
+    level_codes = np.where(codes >= 0, category_levels[codes], -1)
+    df['Attorney level'] = pd.Categorical.from_codes(level_codes, dtype=level_dtype)
+    return df
+
+
+def dataset_bounds(manifest):
+    partitions = manifest['partitions'].values()
+    min_date = min(pd.Timestamp(p['min_date']) for p in partitions)
+    max_date = max(pd.Timestamp(p['max_date']) for p in partitions)
+    return min_date, max_date
+
+
+def dataset_quarters(manifest):
+    return sorted({(p['month'] - 1) // 3 + 1 for p in manifest['partitions'].values()})
+
+
+def build_catalog(manifest, roster):
+    # Everything the sidebar lists, built from the manifest and the roster
+    # alone: date bounds, quarters and the sorted values of each dimension.
+    # Nothing here scans the time entries
+    options = {col: sorted(values) for col, values in manifest['categories'].items()}
+    options['Attorney level'] = sorted(roster.unique())
+    return {
+        'bounds': dataset_bounds(manifest),
+        'quarters': dataset_quarters(manifest),
+        'options': options,
+    }
+
+
+if __name__ == "__main__":
+    # Weekly refresh: python data_store.py [export.csv] [--full] [--chunk-rows N]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest a time-entry export into the dashboard dataset")
+    parser.add_argument('export', nargs='?', default=SOURCE_CSV)
+    parser.add_argument('--full', action='store_true', help="rebuild the dataset instead of appending")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="rows per chunk when streaming a full build")
+    args = parser.parse_args()
+
+    with ingest_lock():
+        result = ingest_export(args.export, full=args.full, chunksize=args.chunk_rows)
+    print(f"{result['mode']} ingest: replaced {result['replaced']:,} rows, appended {result['appended']:,} rows")
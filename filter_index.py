@@ -0,0 +1,175 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Sidebar filter -> column it selects on
+FILTER_DIMENSIONS = {
+    'attorney_levels': 'Attorney level',
+    'attorneys': 'User full name (first, last)',
+    'practices': 'Practice area',
+    'locations': 'Matter location',
+    'statuses': 'Matter status',
+    'clients': 'Company name',
+    'quarters': 'Activity quarter',
+}
+
+# Most distinct values a dimension keeps bitmaps for. Each bitmap costs a bit
+# per row, so this many already take as much room as a 32-bit code per row.
+# Dimensions with more values (clients, attorneys) match on their codes
+# instead
+BITMAP_MAX_VALUES = 32
+
+
+def value_codes(values):
+    # Integer code per row (-1 for missing) and the value each code stands for
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values)
+
+
+def build_bitmaps(codes, labels):
+    # One packed row bitmap per value present in these rows: bit i is set
+    # when row i holds that value. Missing values get no bit, so they never
+    # match a selection
+    present = np.unique(codes[codes >= 0])
+    slots = np.full(len(labels), -1)
+    slots[present] = np.arange(len(present))
+    bitmaps = np.zeros((len(present), (len(codes) + 7) // 8), dtype=np.uint8)
+    rows = np.flatnonzero(codes >= 0)
+    bits = (0x80 >> (rows & 7)).astype(np.uint8)
+    np.bitwise_or.at(bitmaps, (slots[codes[rows]], rows >> 3), bits)
+    return {labels[code]: bitmaps[i] for i, code in enumerate(present)}
+
+
+def build_filter_index(df):
+    # Built once per loaded period; every filter change afterwards is just
+    # bitwise ops over these arrays. Rows must be ordered by activity date,
+    # which lets a date range resolve to one slice by binary search
+    dates = df['Activity date']
+    if not dates.is_monotonic_increasing:
+        raise ValueError("filter index needs rows sorted by 'Activity date'")
+    index = {
+        'rows': len(df),
+        'dates': dates.to_numpy(),
+        'hours': df['Billed & Unbilled hours'].to_numpy(dtype='float64', na_value=0),
+        # Cube cells stand for several entries each; a time entry is one
+        'entries': df['Entries'].to_numpy() if 'Entries' in df else None,
+        'codes': {},
+        'labels': {},
+        'bitmaps': {},
+    }
+    for column in FILTER_DIMENSIONS.values():
+        codes, labels = value_codes(df[column])
+        index['codes'][column] = codes
+        index['labels'][column] = labels
+        if len(np.unique(codes[codes >= 0])) <= BITMAP_MAX_VALUES:
+            index['bitmaps'][column] = build_bitmaps(codes, labels)
+    return index
+
+
+def select_rows(index, selections, start_date=None, end_date=None):
+    # OR the bitmaps of the values chosen within a dimension, AND across
+    # dimensions. Dimensions without bitmaps match on their row codes.
+    # Returns the matching row positions (a plain slice when only
+    # the date range applies), or None when nothing is filtered out
+    mask = None
+    for column, values in selections.items():
+        if not values:
+            continue
+        if column in index['bitmaps']:
+            bitmaps = index['bitmaps'][column]
+            selected = np.zeros((index['rows'] + 7) // 8, dtype=np.uint8)
+            for value in values:
+                if value in bitmaps:
+                    np.bitwise_or(selected, bitmaps[value], out=selected)
+        else:
+            codes = index['labels'][column].get_indexer(list(values))
+            selected = np.packbits(np.isin(index['codes'][column], codes[codes >= 0]))
+        mask = selected if mask is None else np.bitwise_and(mask, selected, out=mask)
+
+    # The date range is the contiguous run of rows [start, stop)
+    start, stop = 0, index['rows']
+    if start_date and end_date:
+        dates = index['dates']
+        start = dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), side='left')
+        stop = dates.searchsorted(np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1)), side='left')
+        stop = max(start, stop)
+
+    if mask is None:
+        if start == 0 and stop == index['rows']:
+            return None
+        return slice(start, stop)
+    # Unpack only the bytes covering the date slice
+    first = start >> 3
+    bits = np.unpackbits(mask[first:(stop + 7) >> 3])[start - first * 8:stop - first * 8]
+    return start + np.flatnonzero(bits)
+
+
+def facet_counts(index, selections, start_date=None, end_date=None):
+    # Rows and hours each value of a dimension would match under the other
+    # dimensions' selections. The bitmaps narrow the rows; one bincount per
+    # dimension then counts every value at once. On a cube index each cell
+    # counts for the entries it holds
+    facets = {}
+    for column in FILTER_DIMENSIONS.values():
+        others = {other: values for other, values in selections.items() if other != column}
+        rows = select_rows(index, others, start_date, end_date)
+        codes, hours, entries = index['codes'][column], index['hours'], index['entries']
+        if rows is not None:
+            codes, hours = codes[rows], hours[rows]
+            entries = None if entries is None else entries[rows]
+        present = codes >= 0
+        size = len(index['labels'][column])
+        counts = np.bincount(
+            codes[present], weights=None if entries is None else entries[present], minlength=size
+        ).astype('int64')
+        facets[column] = pd.DataFrame({
+            'rows': counts,
+            'hours': np.bincount(codes[present], weights=hours[present], minlength=size),
+        }, index=index['labels'][column])
+    return facets
+
+
+def new_view_cache(max_bytes):
+    # Filtered views keyed on the normalized filter state, least recently
+    # used first. Shared across sessions, so every access takes the lock
+    return {'views': OrderedDict(), 'bytes': 0, 'max_bytes': max_bytes, 'lock': threading.Lock()}
+
+
+def lookup_view(cache, key):
+    # The stored view, marked as just used, or None
+    with cache['lock']:
+        if key not in cache['views']:
+            return None
+        cache['views'].move_to_end(key)
+        return cache['views'][key][0]
+
+
+def store_view(cache, key, view):
+    size = int(view.memory_usage(index=True).sum())
+    with cache['lock']:
+        if key not in cache['views'] and size <= cache['max_bytes']:
+            cache['views'][key] = (view, size)
+            cache['bytes'] += size
+            # Evict the least recently used views until back under the cap
+            while cache['bytes'] > cache['max_bytes']:
+                _, (_, evicted) = cache['views'].popitem(last=False)
+                cache['bytes'] -= evicted
+    return view
+
+
+def cached_view(cache, key, compute):
+    view = lookup_view(cache, key)
+    return store_view(cache, key, compute()) if view is None else view
+
+
+def cached_views(cache, keys, compute):
+    # Several views at once: `compute` gets the keys that aren't stored yet
+    # and returns their views together, so missing ones share one pass
+    views = {key: lookup_view(cache, key) for key in keys}
+    missing = [key for key, view in views.items() if view is None]
+    if missing:
+        for key, view in compute(missing).items():
+            views[key] = store_view(cache, key, view)
+    return views
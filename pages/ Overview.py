@@ -9,70 +9,73 @@ import os
 
 # Import functions from Home.py
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from Home import load_data, apply_filters, create_sidebar_filters
+from Home import aggregate_many, dimension_metrics, period_totals, create_period_filters, create_sidebar_filters, last_refreshed, period_comparison, kpi_delta, top_n
 
 # Page config
 st.set_page_config(page_title="Overview - Scale LLP Dashboard", layout="wide")
 
-# Load data and create filters
-df = load_data()
-create_sidebar_filters(df)  # Pass df here
-filtered_df = apply_filters(df)
+# Create period filters, then the sidebar filters; the sections below are
+# read from the cube of the period they select
+create_period_filters()
+create_sidebar_filters()
 
 # Add date range note
 if st.session_state.filters['start_date'] and st.session_state.filters['end_date']:
     st.markdown(f"*Showing data from {st.session_state.filters['start_date'].strftime('%B %d, %Y')} to {st.session_state.filters['end_date'].strftime('%B %d, %Y')}*")
 
+# The monthly trend, plus the practice area and attorney measures shared
+# with their own pages
+metrics = aggregate_many({
+    'monthly': ('Month start', {'Billed hours': 'sum'}),
+})
+dimensions = dimension_metrics(['Practice area', 'User full name (first, last)'])
+metrics['practices'] = dimensions['Practice area']
+metrics['attorneys'] = dimensions['User full name (first, last)']
+
 # Page Header
 st.title("Overview")
-st.markdown(f"*Last refreshed: Wednesday Feb 19, 2025*")
+st.markdown(f"*Last refreshed: {last_refreshed()}*")
 
 # Key Performance Metrics
 st.markdown("### Key Performance Metrics")
+kpis = period_comparison({
+    'hours': ('sum', 'Billed & Unbilled hours'),
+    'billed': ('sum', 'Billed hours'),
+    'utilization': ('mean', 'Utilization rate'),
+    'revenue': ('sum', 'Billed hours value'),
+})
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_billable_hours = filtered_df['Billed & Unbilled hours'].sum()
-    prev_total = total_billable_hours * 0.95
-    delta = ((total_billable_hours - prev_total) / prev_total) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    total_billable_hours = kpis.at['hours', 'current']
     st.metric(
         "Total Billable Hours",
         f"{total_billable_hours:,.1f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['hours'])
     )
 
 with col2:
-    total_billed = filtered_df['Billed hours'].sum()
-    prev_billed = total_billed * 0.95
-    delta = ((total_billed - prev_billed) / prev_billed) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    total_billed = kpis.at['billed', 'current']
     st.metric(
         "Billed Hours",
         f"{total_billed:,.1f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['billed'])
     )
 
 with col3:
-    avg_utilization = filtered_df['Utilization rate'].mean()
-    prev_util = avg_utilization * 0.95
-    delta = ((avg_utilization - prev_util) / prev_util) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_utilization = kpis.at['utilization', 'current']
     st.metric(
         "Average Utilization",
         f"{avg_utilization:.1f}%",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['utilization'])
     )
 
 with col4:
-    total_revenue = filtered_df['Billed hours value'].sum()
-    prev_revenue = total_revenue * 0.95
-    delta = ((total_revenue - prev_revenue) / prev_revenue) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    total_revenue = kpis.at['revenue', 'current']
     st.metric(
         "Total Revenue",
         f"${total_revenue:,.2f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['revenue'])
     )
 
 # Hours Distribution and Trends
@@ -83,11 +86,7 @@ with col1:
     # Hours Distribution Pie Chart
     hours_data = pd.DataFrame({
         'Category': ['Billed Hours', 'Unbilled Hours', 'Non-billable Hours'],
-        'Hours': [
-            filtered_df['Billed hours'].sum(),
-            filtered_df['Unbilled hours'].sum(),
-            filtered_df['Non-billable hours'].sum()
-        ]
+        'Hours': period_totals(['Billed hours', 'Unbilled hours', 'Non-billable hours']).to_list()
     })
     
     fig_hours = px.pie(
@@ -101,14 +100,9 @@ with col1:
 
 with col2:
     # Monthly Billable Hours Trend
-    monthly_data = filtered_df.groupby(['Activity Year', 'Activity month']).agg({
-        'Billed hours': 'sum'
-    }).reset_index()
+    monthly_data = metrics['monthly'].reset_index()
     
-    monthly_data['Date'] = pd.to_datetime(
-        monthly_data['Activity Year'].astype(int).astype(str) + '-' + 
-        monthly_data['Activity month'].astype(int).astype(str).str.zfill(2) + '-01'
-    )
+    monthly_data = monthly_data.rename(columns={'Month start': 'Date'})
     
     fig_trend = px.line(
         monthly_data,
@@ -126,12 +120,10 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Revenue by Practice Area
-    practice_revenue = filtered_df.groupby('Practice area').agg({
-        'Billed hours value': 'sum'
-    }).reset_index()
+    practice_revenue = top_n('practices', metrics['practices'], 'Billed hours value', 10)[['Billed hours value']].reset_index()
     
     fig_practice = px.bar(
-        practice_revenue.sort_values('Billed hours value', ascending=True).tail(10),
+        practice_revenue.iloc[::-1],
         x='Billed hours value',
         y='Practice area',
         title='Top 10 Practice Areas by Revenue',
@@ -141,12 +133,10 @@ with col1:
 
 with col2:
     # Utilization by Practice Area
-    practice_util = filtered_df.groupby('Practice area').agg({
-        'Utilization rate': 'mean'
-    }).reset_index()
+    practice_util = top_n('practices', metrics['practices'], 'Utilization rate', 10)[['Utilization rate']].reset_index()
     
     fig_util = px.bar(
-        practice_util.sort_values('Utilization rate', ascending=True).tail(10),
+        practice_util.iloc[::-1],
         x='Utilization rate',
         y='Practice area',
         title='Top 10 Practice Areas by Utilization Rate',
@@ -160,9 +150,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Top Performers by Revenue
-    top_attorneys = filtered_df.groupby('User full name (first, last)').agg({
-        'Billed hours value': 'sum'
-    }).sort_values('Billed hours value', ascending=False).head(10)
+    top_attorneys = top_n('attorneys', metrics['attorneys'], 'Billed hours value', 10)[['Billed hours value']]
     
     fig_top_attorneys = px.bar(
         top_attorneys,
@@ -175,9 +163,7 @@ with col1:
 
 with col2:
     # Top Performers by Utilization
-    top_utilization = filtered_df.groupby('User full name (first, last)').agg({
-        'Utilization rate': 'mean'
-    }).sort_values('Utilization rate', ascending=False).head(10)
+    top_utilization = top_n('attorneys', metrics['attorneys'], 'Utilization rate', 10)[['Utilization rate']]
     
     fig_top_util = px.bar(
         top_utilization,
@@ -9,83 +9,99 @@ import os
 
 # Import functions from Home.py
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from Home import load_data, apply_filters, create_sidebar_filters
+from Home import aggregate, aggregate_many, dimension_metrics, create_period_filters, create_sidebar_filters, last_refreshed, period_comparison, kpi_delta, top_n
 
 # Page config
 st.set_page_config(page_title="Attorney Analysis - Scale LLP Dashboard", layout="wide")
 
-# Load data and create filters
-df = load_data()
-create_sidebar_filters(df)  # Pass df here
-filtered_df = apply_filters(df)
+# Create period filters, then the sidebar filters; the sections below are
+# read from the cube of the period they select
+create_period_filters()
+create_sidebar_filters()
 
 # Add date range note
 if st.session_state.filters['start_date'] and st.session_state.filters['end_date']:
     st.markdown(f"*Showing data from {st.session_state.filters['start_date'].strftime('%B %d, %Y')} to {st.session_state.filters['end_date'].strftime('%B %d, %Y')}*")
 
+# The page's aggregations that don't depend on each other, computed together.
+# Every per-attorney section reads the shared attorney measures
+metrics = aggregate_many({
+    'levels': ('Attorney level', {'Billed hours value': 'sum', 'Utilization rate': 'mean'}),
+    'attorney_clients': (['User full name (first, last)', 'Company name'], {'Billed hours value': 'sum'}),
+    'attorney_practices': (['User full name (first, last)', 'Practice area'], {'Billed hours': 'sum'}),
+    'level_practices': (['Attorney level', 'Practice area'], {'Billed hours': 'sum'}),
+    'level_attorneys': (['Attorney level', 'User full name (first, last)'], {
+        'Matter number': 'nunique',
+        'Billed hours': 'sum'
+    }),
+    'level_summary': ('Attorney level', {
+        'Billed hours': ['sum', 'mean', 'std'],
+        'Billed hours value': ['sum', 'mean'],
+        'Utilization rate': ['mean', 'std'],
+        'User full name (first, last)': 'nunique',
+        'Company name': 'nunique',
+        'Matter number': 'nunique'
+    }),
+})
+metrics['attorneys'] = dimension_metrics(['User full name (first, last)'])['User full name (first, last)']
+
 # Page Header
 st.title("Attorney Analysis")
-st.markdown(f"*Last refreshed: Wednesday Feb 19, 2025*")
+st.markdown(f"*Last refreshed: {last_refreshed()}*")
 
 # Key Attorney Metrics
 st.markdown("### Key Attorney Metrics")
+kpis = period_comparison({
+    'attorneys': ('nunique', 'User full name (first, last)'),
+    'utilization': ('mean', 'Utilization rate'),
+    'revenue': ('per', 'Billed hours value', 'User full name (first, last)'),
+    'hours': ('per', 'Billed hours', 'User full name (first, last)'),
+})
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_attorneys = filtered_df['User full name (first, last)'].nunique()
-    prev_attorneys = max(total_attorneys * 0.95, 1)  # Prevent zero division
-    delta = ((total_attorneys - prev_attorneys) / prev_attorneys) * 100 if prev_attorneys > 0 else 0
-    arrow = "↗️" if delta > 0 else "↘️"
+    total_attorneys = kpis.at['attorneys', 'current']
     st.metric(
         "Total Attorneys",
-        f"{total_attorneys:,}",
-        f"{arrow} {delta:.1f}%"
+        f"{total_attorneys:,.0f}",
+        kpi_delta(*kpis.loc['attorneys'])
     )
 
 with col2:
-    avg_utilization = filtered_df['Utilization rate'].mean()
-    prev_util = max(avg_utilization * 0.95, 1)  # Prevent zero division
-    delta = ((avg_utilization - prev_util) / prev_util) * 100 if prev_util > 0 else 0
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_utilization = kpis.at['utilization', 'current']
     st.metric(
         "Average Utilization",
         f"{avg_utilization:.1f}%",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['utilization'])
     )
 
 with col3:
-    avg_revenue_per_attorney = filtered_df.groupby('User full name (first, last)')['Billed hours value'].sum().mean()
-    prev_revenue = max(avg_revenue_per_attorney * 0.95, 1)  # Prevent zero division
-    delta = ((avg_revenue_per_attorney - prev_revenue) / prev_revenue) * 100 if prev_revenue > 0 else 0
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_revenue_per_attorney = kpis.at['revenue', 'current']
     st.metric(
         "Avg Revenue per Attorney",
         f"${avg_revenue_per_attorney:,.2f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['revenue'])
     )
 
 with col4:
-    avg_hours_per_attorney = filtered_df.groupby('User full name (first, last)')['Billed hours'].sum().mean()
-    prev_hours = max(avg_hours_per_attorney * 0.95, 1)  # Prevent zero division
-    delta = ((avg_hours_per_attorney - prev_hours) / prev_hours) * 100 if prev_hours > 0 else 0
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_hours_per_attorney = kpis.at['hours', 'current']
     st.metric(
         "Avg Hours per Attorney",
         f"{avg_hours_per_attorney:.1f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['hours'])
     )
 
 # Attorney Performance Matrix
 st.markdown("### Attorney Performance Matrix")
-attorney_metrics = filtered_df.groupby('User full name (first, last)').agg({
-    'Billed hours': 'sum',
-    'Utilization rate': 'mean',
-    'Billed hours value': 'sum',
-    'Attorney level': 'first'
-}).reset_index()
+attorney_metrics = metrics['attorneys'][
+    ['Billed hours', 'Utilization rate', 'Billed hours value', 'Attorney level']
+].reset_index()
 
 # Handle any null or infinite values
-attorney_metrics = attorney_metrics.fillna(0)
+metric_columns = ['Billed hours', 'Utilization rate', 'Billed hours value']
+attorney_metrics[metric_columns] = attorney_metrics[metric_columns].fillna(0)
+# Attorneys missing from the roster have no level; plot them as their own group
+attorney_metrics['Attorney level'] = attorney_metrics['Attorney level'].astype('object').fillna('Unassigned')
 attorney_metrics = attorney_metrics.replace([float('inf'), float('-inf')], 0)
 
 fig_matrix = px.scatter(
@@ -111,9 +127,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Revenue by Attorney Level
-    level_revenue = filtered_df.groupby('Attorney level').agg({
-        'Billed hours value': 'sum'
-    }).reset_index()
+    level_revenue = metrics['levels'][['Billed hours value']].reset_index()
     
     fig_level_revenue = px.pie(
         level_revenue,
@@ -125,9 +139,7 @@ with col1:
 
 with col2:
     # Utilization by Attorney Level
-    level_util = filtered_df.groupby('Attorney level').agg({
-        'Utilization rate': 'mean'
-    }).reset_index()
+    level_util = metrics['levels'][['Utilization rate']].reset_index()
     
     fig_level_util = px.bar(
         level_util,
@@ -140,19 +152,11 @@ with col2:
 # Attorney Utilization Trends
 st.markdown("### Attorney Utilization Trends")
 # Get top 5 attorneys by revenue for trend analysis
-top_5_attorneys = filtered_df.groupby('User full name (first, last)')['Billed hours value'].sum().nlargest(5).index
+top_5_attorneys = top_n('attorneys', metrics['attorneys'], 'Billed hours value', 5).index
 
-attorney_trends = filtered_df[
-    filtered_df['User full name (first, last)'].isin(top_5_attorneys)
-].groupby(['Activity Year', 'Activity month', 'User full name (first, last)']).agg({
+attorney_trends = aggregate(['Month start', 'User full name (first, last)'], {
     'Utilization rate': 'mean'
-}).reset_index()
-
-# Fix date handling
-attorney_trends['Date'] = pd.to_datetime(
-    attorney_trends['Activity Year'].astype(int).astype(str) + '-' + 
-    attorney_trends['Activity month'].astype(int).astype(str).str.zfill(2) + '-01'
-)
+}, where={'User full name (first, last)': top_5_attorneys}).reset_index().rename(columns={'Month start': 'Date'})
 
 fig_trends = px.line(
     attorney_trends,
@@ -175,11 +179,9 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Top Attorney-Client Pairs by Revenue
-    attorney_client_revenue = filtered_df.groupby(['User full name (first, last)', 'Company name']).agg({
-        'Billed hours value': 'sum'
-    }).reset_index()
+    attorney_client_revenue = metrics['attorney_clients'].reset_index()
     
-    top_pairs = attorney_client_revenue.nlargest(10, 'Billed hours value')
+    top_pairs = top_n('attorney_clients', attorney_client_revenue, 'Billed hours value', 10)
     
     fig_top_pairs = px.bar(
         top_pairs,
@@ -194,8 +196,10 @@ with col1:
 
 with col2:
     # Client Count by Attorney Level
-    client_count_by_level = filtered_df.groupby(['Attorney level', 'Company name']).size().reset_index(name='count')
-    client_count_summary = client_count_by_level.groupby('Attorney level').size().reset_index(name='Number of Clients')
+    client_count_by_level = aggregate(['Attorney level', 'Company name'], {
+        'Activity date': 'size'
+    }).reset_index().rename(columns={'Activity date': 'count'})
+    client_count_summary = client_count_by_level.groupby('Attorney level', observed=True).size().reset_index(name='Number of Clients')
     
     fig_client_count = px.pie(
         client_count_summary,
@@ -211,11 +215,10 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Average Client Value by Attorney
-    avg_client_value = filtered_df.groupby(['User full name (first, last)', 'Company name']).agg({
-        'Billed hours value': 'sum'
-    }).reset_index().groupby('User full name (first, last)').agg({
+    avg_client_value = metrics['attorney_clients'].reset_index().groupby('User full name (first, last)', observed=True).agg({
         'Billed hours value': 'mean'
-    }).round(2).nlargest(10, 'Billed hours value')
+    }).round(2)
+    avg_client_value = top_n('attorney_client_values', avg_client_value, 'Billed hours value', 10)
     
     fig_avg_value = px.bar(
         avg_client_value,
@@ -226,7 +229,7 @@ with col1:
 
 with col2:
     # Client Count per Attorney
-    client_count_per_attorney = filtered_df.groupby('User full name (first, last)')['Company name'].nunique().nlargest(10)
+    client_count_per_attorney = top_n('attorneys', metrics['attorneys'], 'Company name', 10)['Company name']
     
     fig_client_count = px.bar(
         client_count_per_attorney,
@@ -241,11 +244,10 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Practice Area Specialization
-    practice_specialization = filtered_df.groupby(['User full name (first, last)', 'Practice area']).agg({
-        'Billed hours': 'sum'
-    }).reset_index()
+    practice_specialization = metrics['attorney_practices'].reset_index()
     
-    top_attorneys = practice_specialization.groupby('User full name (first, last)')['Billed hours'].sum().nlargest(10).index
+    practice_hours = practice_specialization.groupby('User full name (first, last)', observed=True)[['Billed hours']].sum()
+    top_attorneys = top_n('attorney_practice_hours', practice_hours, 'Billed hours', 10).index
     practice_specialization_filtered = practice_specialization[
         practice_specialization['User full name (first, last)'].isin(top_attorneys)
     ]
@@ -263,9 +265,7 @@ with col1:
 
 with col2:
     # Attorney Level Practice Distribution
-    level_practice_dist = filtered_df.groupby(['Attorney level', 'Practice area']).agg({
-        'Billed hours': 'sum'
-    }).reset_index()
+    level_practice_dist = metrics['level_practices'].reset_index()
     
     fig_level_practice = px.sunburst(
         level_practice_dist,
@@ -279,16 +279,11 @@ with col2:
 st.markdown("### Performance Heatmap")
 
 # Create performance metrics for top attorneys
-top_attorneys_list = filtered_df.groupby('User full name (first, last)')['Billed hours value'].sum().nlargest(15).index
-
-performance_metrics = filtered_df[
-    filtered_df['User full name (first, last)'].isin(top_attorneys_list)
-].pivot_table(
-    index='User full name (first, last)',
-    columns='Activity month',
-    values='Utilization rate',
-    aggfunc='mean'
-)
+top_attorneys_list = top_n('attorneys', metrics['attorneys'], 'Billed hours value', 15).index
+
+performance_metrics = aggregate(['User full name (first, last)', 'Activity month'], {
+    'Utilization rate': 'mean'
+}, where={'User full name (first, last)': top_attorneys_list})['Utilization rate'].dropna().unstack()
 
 # Convert month numbers to names
 performance_metrics.columns = [calendar.month_name[int(m)] for m in performance_metrics.columns]
@@ -308,7 +303,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Matter Count Distribution
-    matter_dist = filtered_df.groupby(['Attorney level', 'User full name (first, last)'])['Matter number'].nunique().reset_index()
+    matter_dist = metrics['level_attorneys']['Matter number'].reset_index()
     
     fig_matter_dist = px.box(
         matter_dist,
@@ -321,7 +316,7 @@ with col1:
 
 with col2:
     # Hours Distribution
-    hours_dist = filtered_df.groupby(['Attorney level', 'User full name (first, last)'])['Billed hours'].sum().reset_index()
+    hours_dist = metrics['level_attorneys']['Billed hours'].reset_index()
     
     fig_hours_dist = px.box(
         hours_dist,
@@ -335,15 +330,13 @@ with col2:
 # Detailed Attorney Metrics Table
 st.markdown("### Detailed Attorney Metrics")
 
-attorney_detail_metrics = filtered_df.groupby('User full name (first, last)').agg({
-    'Billed hours': 'sum',
-    'Billed hours value': 'sum',
-    'Matter number': 'nunique',
-    'Utilization rate': 'mean',
-    'User rate': 'first',
-    'Attorney level': 'first',
-    'Company name': 'nunique'  # Added client count
-}).round(2)
+# Standard rates are each attorney's first recorded rate, which only the
+# time entries have, so they're read for this table alone
+rates = aggregate('User full name (first, last)', {'User rate': 'first'})
+attorney_detail_metrics = metrics['attorneys'].join(rates)[[
+    'Billed hours', 'Billed hours value', 'Matter number', 'Utilization rate',
+    'User rate', 'Attorney level', 'Company name'
+]].round(2)
 
 # Calculate additional metrics with zero division handling
 attorney_detail_metrics['Revenue per Hour'] = (
@@ -382,14 +375,7 @@ st.download_button(
 # Summary Statistics
 st.markdown("### Summary Statistics by Attorney Level")
 
-summary_stats = filtered_df.groupby('Attorney level').agg({
-    'Billed hours': ['sum', 'mean', 'std'],
-    'Billed hours value': ['sum', 'mean'],
-    'Utilization rate': ['mean', 'std'],
-    'User full name (first, last)': 'nunique',
-    'Company name': 'nunique',
-    'Matter number': 'nunique'
-}).round(2)
+summary_stats = metrics['level_summary'].round(2)
 
 # Flatten column names
 summary_stats.columns = [
@@ -452,4 +438,4 @@ st.markdown("""
 
 # Footer with last update time
 st.markdown("---")
-st.markdown(f"*Last data refresh: Wednesday Feb 19, 2025*")
+st.markdown(f"*Last data refresh: {last_refreshed()}*")
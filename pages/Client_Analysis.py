@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
@@ -9,71 +8,72 @@ import os
 
 # Import functions from Home.py
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from Home import load_data, apply_filters, create_sidebar_filters
+from Home import aggregate, aggregate_many, dimension_metrics, create_period_filters, create_sidebar_filters, last_refreshed, period_comparison, kpi_delta, top_n
 
 # Page config
 st.set_page_config(page_title="Client Analysis - Scale LLP Dashboard", layout="wide")
 
-# Load data and create filters
-df = load_data()
-create_sidebar_filters(df)  # Pass df here
-filtered_df = apply_filters(df)
+# Create period filters, then the sidebar filters; the sections below are
+# read from the cube of the period they select
+create_period_filters()
+create_sidebar_filters()
 
 # Add date range note
 if st.session_state.filters['start_date'] and st.session_state.filters['end_date']:
     st.markdown(f"*Showing data from {st.session_state.filters['start_date'].strftime('%B %d, %Y')} to {st.session_state.filters['end_date'].strftime('%B %d, %Y')}*")
 
 
+# The page's aggregations that don't depend on each other, computed together.
+# Every per-client section reads the shared client measures
+metrics = aggregate_many({
+    'client_practices': (['Practice area', 'Company name'], {'Billed hours': 'sum'}),
+})
+metrics['clients'] = dimension_metrics(['Company name'])['Company name']
+
 # Page Header
 st.title("Client Analysis")
-st.markdown(f"*Last refreshed: Wednesday Feb 19, 2025*")
+st.markdown(f"*Last refreshed: {last_refreshed()}*")
 
 # Key Client Metrics
 st.markdown("### Key Client Metrics")
+kpis = period_comparison({
+    'clients': ('nunique', 'Company name'),
+    'revenue': ('per', 'Billed hours value', 'Company name'),
+    'hours': ('per', 'Billed hours', 'Company name'),
+    'matters': ('nunique', 'Matter number'),
+})
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_clients = filtered_df['Company name'].nunique()
-    prev_clients = total_clients * 0.95
-    delta = ((total_clients - prev_clients) / prev_clients) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    total_clients = kpis.at['clients', 'current']
     st.metric(
         "Total Active Clients",
-        f"{total_clients:,}",
-        f"{arrow} {delta:.1f}%"
+        f"{total_clients:,.0f}",
+        kpi_delta(*kpis.loc['clients'])
     )
 
 with col2:
-    avg_revenue_per_client = filtered_df.groupby('Company name')['Billed hours value'].sum().mean()
-    prev_avg = avg_revenue_per_client * 0.95
-    delta = ((avg_revenue_per_client - prev_avg) / prev_avg) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_revenue_per_client = kpis.at['revenue', 'current']
     st.metric(
         "Avg Revenue per Client",
         f"${avg_revenue_per_client:,.2f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['revenue'])
     )
 
 with col3:
-    avg_hours_per_client = filtered_df.groupby('Company name')['Billed hours'].sum().mean()
-    prev_hours = avg_hours_per_client * 0.95
-    delta = ((avg_hours_per_client - prev_hours) / prev_hours) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_hours_per_client = kpis.at['hours', 'current']
     st.metric(
         "Avg Hours per Client",
         f"{avg_hours_per_client:.1f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['hours'])
     )
 
 with col4:
-    total_matters = filtered_df['Matter number'].nunique()
-    prev_matters = total_matters * 0.95
-    delta = ((total_matters - prev_matters) / prev_matters) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    total_matters = kpis.at['matters', 'current']
     st.metric(
         "Total Active Matters",
-        f"{total_matters:,}",
-        f"{arrow} {delta:.1f}%"
+        f"{total_matters:,.0f}",
+        kpi_delta(*kpis.loc['matters'])
     )
 
 # Top Clients Analysis
@@ -82,9 +82,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Top 10 Clients by Revenue
-    top_clients_revenue = filtered_df.groupby('Company name').agg({
-        'Billed hours value': 'sum'
-    }).sort_values('Billed hours value', ascending=True).tail(10)
+    top_clients_revenue = top_n('clients', metrics['clients'], 'Billed hours value', 10)[['Billed hours value']].iloc[::-1]
     
     fig_top_revenue = px.bar(
         top_clients_revenue,
@@ -98,9 +96,7 @@ with col1:
 
 with col2:
     # Top 10 Clients by Hours
-    top_clients_hours = filtered_df.groupby('Company name').agg({
-        'Billed hours': 'sum'
-    }).sort_values('Billed hours', ascending=True).tail(10)
+    top_clients_hours = top_n('clients', metrics['clients'], 'Billed hours', 10)[['Billed hours']].iloc[::-1]
     
     fig_top_hours = px.bar(
         top_clients_hours,
@@ -114,9 +110,7 @@ with col2:
 
 # Client Practice Area Distribution
 st.markdown("### Client Distribution by Practice Area")
-client_practice = filtered_df.groupby(['Practice area', 'Company name']).agg({
-    'Billed hours': 'sum'
-}).reset_index()
+client_practice = metrics['client_practices'].reset_index()
 
 fig_practice = px.treemap(
     client_practice,
@@ -130,15 +124,13 @@ st.plotly_chart(fig_practice, use_container_width=True)
 st.markdown("### Client Revenue Trends")
 
 # Get top 5 clients for trend analysis
-top_5_clients = filtered_df.groupby('Company name')['Billed hours value'].sum().nlargest(5).index
+top_5_clients = top_n('clients', metrics['clients'], 'Billed hours value', 5).index
 
 try:
     # Prepare trend data
-    client_trends = filtered_df[filtered_df['Company name'].isin(top_5_clients)].groupby(
-        ['Activity date', 'Company name']
-    ).agg({
+    client_trends = aggregate(['Activity date', 'Company name'], {
         'Billed hours value': 'sum'
-    }).reset_index()
+    }, where={'Company name': top_5_clients}).reset_index()
 
     # Sort by date
     client_trends = client_trends.sort_values('Activity date')
@@ -166,7 +158,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Matters per Client
-    matters_per_client = filtered_df.groupby('Company name')['Matter number'].nunique().sort_values(ascending=True).tail(10)
+    matters_per_client = top_n('clients', metrics['clients'], 'Matter number', 10)['Matter number'].iloc[::-1]
     
     fig_matters = px.bar(
         matters_per_client,
@@ -178,14 +170,9 @@ with col1:
 
 with col2:
     # Average Rate by Client
-    avg_rate_by_client = (
-        filtered_df.groupby('Company name').agg({
-            'Billed hours value': 'sum',
-            'Billed hours': 'sum'
-        })
-    )
+    avg_rate_by_client = metrics['clients'][['Billed hours value', 'Billed hours']]
     avg_rate_by_client['Average Rate'] = avg_rate_by_client['Billed hours value'] / avg_rate_by_client['Billed hours']
-    avg_rate_by_client = avg_rate_by_client.sort_values('Average Rate', ascending=True).tail(10)
+    avg_rate_by_client = top_n('client_rates', avg_rate_by_client, 'Average Rate', 10).iloc[::-1]
     
     fig_rates = px.bar(
         avg_rate_by_client,
@@ -200,12 +187,7 @@ with col2:
 # Detailed Client Metrics Table
 st.markdown("### Detailed Client Metrics")
 
-client_metrics = filtered_df.groupby('Company name').agg({
-    'Billed hours': 'sum',
-    'Billed hours value': 'sum',
-    'Matter number': 'nunique',
-    'Utilization rate': 'mean'
-}).round(2)
+client_metrics = metrics['clients'].round(2)
 
 # Calculate additional metrics
 client_metrics['Average Hourly Rate'] = (
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
@@ -9,71 +8,68 @@ import os
 
 # Import functions from Home.py
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from Home import load_data, apply_filters, create_sidebar_filters
+from Home import aggregate, dimension_metrics, create_period_filters, create_sidebar_filters, last_refreshed, period_comparison, kpi_delta, top_n
 
 # Page config
 st.set_page_config(page_title="Practice Areas - Scale LLP Dashboard", layout="wide")
 
-# Load data and create filters
-df = load_data()
-create_sidebar_filters(df)  # Pass df here
-filtered_df = apply_filters(df)
+# Create period filters, then the sidebar filters; the sections below are
+# read from the cube of the period they select
+create_period_filters()
+create_sidebar_filters()
 
 # Add date range note
 if st.session_state.filters['start_date'] and st.session_state.filters['end_date']:
     st.markdown(f"*Showing data from {st.session_state.filters['start_date'].strftime('%B %d, %Y')} to {st.session_state.filters['end_date'].strftime('%B %d, %Y')}*")
 
 
+# Every per-practice section reads the shared practice area measures
+metrics = {'practices': dimension_metrics(['Practice area'])['Practice area']}
+
 # Page Header
 st.title("Practice Areas Analysis")
-st.markdown(f"*Last refreshed: Wednesday Feb 19, 2025*")
+st.markdown(f"*Last refreshed: {last_refreshed()}*")
 
 # Key Practice Area Metrics
 st.markdown("### Key Practice Area Metrics")
+kpis = period_comparison({
+    'practices': ('nunique', 'Practice area'),
+    'revenue': ('per', 'Billed hours value', 'Practice area'),
+    'utilization': ('mean_per', 'Utilization rate', 'Practice area'),
+    'rate': ('ratio', ('Billed hours value', 'Billed hours')),
+})
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_practices = filtered_df['Practice area'].nunique()
-    prev_practices = total_practices * 0.95
-    delta = ((total_practices - prev_practices) / prev_practices) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    total_practices = kpis.at['practices', 'current']
     st.metric(
         "Total Practice Areas",
-        f"{total_practices:,}",
-        f"{arrow} {delta:.1f}%"
+        f"{total_practices:,.0f}",
+        kpi_delta(*kpis.loc['practices'])
     )
 
 with col2:
-    avg_revenue_per_practice = filtered_df.groupby('Practice area')['Billed hours value'].sum().mean()
-    prev_revenue = avg_revenue_per_practice * 0.95
-    delta = ((avg_revenue_per_practice - prev_revenue) / prev_revenue) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_revenue_per_practice = kpis.at['revenue', 'current']
     st.metric(
         "Avg Revenue per Practice",
         f"${avg_revenue_per_practice:,.2f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['revenue'])
     )
 
 with col3:
-    avg_utilization = filtered_df.groupby('Practice area')['Utilization rate'].mean().mean()
-    prev_util = avg_utilization * 0.95
-    delta = ((avg_utilization - prev_util) / prev_util) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_utilization = kpis.at['utilization', 'current']
     st.metric(
         "Average Utilization",
         f"{avg_utilization:.1f}%",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['utilization'])
     )
 
 with col4:
-    avg_rate = (filtered_df['Billed hours value'].sum() / filtered_df['Billed hours'].sum())
-    prev_rate = avg_rate * 0.95
-    delta = ((avg_rate - prev_rate) / prev_rate) * 100
-    arrow = "↗️" if delta > 0 else "↘️"
+    avg_rate = kpis.at['rate', 'current']
     st.metric(
         "Average Hourly Rate",
         f"${avg_rate:.2f}",
-        f"{arrow} {delta:.1f}%"
+        kpi_delta(*kpis.loc['rate'])
     )
 
 # Practice Area Performance Overview
@@ -82,9 +78,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Revenue by Practice Area
-    practice_revenue = filtered_df.groupby('Practice area').agg({
-        'Billed hours value': 'sum'
-    }).sort_values('Billed hours value', ascending=True)
+    practice_revenue = metrics['practices'][['Billed hours value']].sort_values('Billed hours value', ascending=True)
     
     fig_revenue = px.bar(
         practice_revenue,
@@ -96,9 +90,7 @@ with col1:
 
 with col2:
     # Hours by Practice Area
-    practice_hours = filtered_df.groupby('Practice area').agg({
-        'Billed hours': 'sum'
-    }).sort_values('Billed hours', ascending=True)
+    practice_hours = metrics['practices'][['Billed hours']].sort_values('Billed hours', ascending=True)
     
     fig_hours = px.bar(
         practice_hours,
@@ -111,13 +103,10 @@ with col2:
 # Practice Area Utilization Analysis
 st.markdown("### Practice Area Utilization")
 
-# Create utilization heatmap by month
-practice_util = filtered_df.pivot_table(
-    values='Utilization rate',
-    index='Practice area',
-    columns='Activity month',
-    aggfunc='mean'
-)
+# Create utilization heatmap by month; months without rated entries stay blank
+practice_util = aggregate(['Practice area', 'Activity month'], {
+    'Utilization rate': 'mean'
+})['Utilization rate'].dropna().unstack()
 
 # Convert month numbers to names
 practice_util.columns = [calendar.month_name[int(m)] for m in practice_util.columns]
@@ -135,18 +124,11 @@ st.plotly_chart(fig_heatmap, use_container_width=True)
 st.markdown("### Practice Area Revenue Trends")
 
 # Get top 5 practice areas
-top_5_practices = filtered_df.groupby('Practice area')['Billed hours value'].sum().nlargest(5).index
+top_5_practices = top_n('practices', metrics['practices'], 'Billed hours value', 5).index
 
-practice_trends = filtered_df[
-    filtered_df['Practice area'].isin(top_5_practices)
-].groupby(['Activity Year', 'Activity month', 'Practice area']).agg({
+practice_trends = aggregate(['Month start', 'Practice area'], {
     'Billed hours value': 'sum'
-}).reset_index()
-
-practice_trends['Date'] = pd.to_datetime(
-    practice_trends['Activity Year'].astype(int).astype(str) + '-' + 
-    practice_trends['Activity month'].astype(int).astype(str).str.zfill(2) + '-01'
-)
+}, where={'Practice area': top_5_practices}).reset_index().rename(columns={'Month start': 'Date'})
 
 fig_trends = px.line(
     practice_trends,
@@ -169,7 +151,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Number of Attorneys per Practice Area
-    attorneys_per_practice = filtered_df.groupby('Practice area')['User full name (first, last)'].nunique().sort_values(ascending=True)
+    attorneys_per_practice = metrics['practices']['User full name (first, last)'].sort_values(ascending=True)
     
     fig_attorneys = px.bar(
         attorneys_per_practice,
@@ -181,7 +163,9 @@ with col1:
 
 with col2:
     # Attorney Levels by Practice Area
-    attorney_levels = filtered_df.groupby(['Practice area', 'Attorney level']).size().reset_index(name='count')
+    attorney_levels = aggregate(['Practice area', 'Attorney level'], {
+        'Activity date': 'size'
+    }).reset_index().rename(columns={'Activity date': 'count'})
     
     fig_levels = px.bar(
         attorney_levels,
@@ -200,12 +184,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Average Rate by Practice Area
-    avg_rate_by_practice = (
-        filtered_df.groupby('Practice area').agg({
-            'Billed hours value': 'sum',
-            'Billed hours': 'sum'
-        })
-    )
+    avg_rate_by_practice = metrics['practices'][['Billed hours value', 'Billed hours']]
     avg_rate_by_practice['Average Rate'] = avg_rate_by_practice['Billed hours value'] / avg_rate_by_practice['Billed hours']
     avg_rate_by_practice = avg_rate_by_practice.sort_values('Average Rate', ascending=True)
     
@@ -221,7 +200,7 @@ with col1:
 
 with col2:
     # Utilization Rate by Practice Area
-    util_by_practice = filtered_df.groupby('Practice area')['Utilization rate'].mean().sort_values(ascending=True)
+    util_by_practice = metrics['practices']['Utilization rate'].sort_values(ascending=True)
     
     fig_util = px.bar(
         util_by_practice,
@@ -234,13 +213,7 @@ with col2:
 # Detailed Practice Area Metrics Table
 st.markdown("### Detailed Practice Area Metrics")
 
-practice_metrics = filtered_df.groupby('Practice area').agg({
-    'Billed hours': 'sum',
-    'Billed hours value': 'sum',
-    'Matter number': 'nunique',
-    'Utilization rate': 'mean',
-    'User full name (first, last)': 'nunique'
-}).round(2)
+practice_metrics = metrics['practices'].round(2)
 
 # Calculate additional metrics
 practice_metrics['Average Rate'] = (
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
@@ -10,41 +9,55 @@ import os
 
 # Import functions from Home.py
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from Home import load_data, apply_filters, create_sidebar_filters
+from Home import aggregate_many, dimension_metrics, create_period_filters, create_sidebar_filters, last_refreshed, top_n
 
 # Page config
 st.set_page_config(page_title="Trending - Scale LLP Dashboard", layout="wide")
 
-# Load data and create filters
-df = load_data()
-create_sidebar_filters(df)  # Pass df here
-filtered_df = apply_filters(df)
+# Create period filters, then the sidebar filters; the sections below are
+# read from the cube of the period they select
+create_period_filters()
+create_sidebar_filters()
 
 # Add date range note
 if st.session_state.filters['start_date'] and st.session_state.filters['end_date']:
     st.markdown(f"*Showing data from {st.session_state.filters['start_date'].strftime('%B %d, %Y')} to {st.session_state.filters['end_date'].strftime('%B %d, %Y')}*")
 
+# The page's trend aggregations, computed together. The top practice areas
+# come from the practice area measures shared with the other pages
+metrics = aggregate_many({
+    'monthly': ('Month start', {
+        'Billed hours': 'sum',
+        'Billed hours value': 'sum',
+        'Utilization rate': 'mean',
+        'Matter number': 'nunique',
+        'Company name': 'nunique'
+    }),
+    'yearly': ('Activity Year', {'Billed hours value': 'sum', 'Utilization rate': 'mean'}),
+    'monthly_practices': (['Month start', 'Practice area'], {'Billed hours value': 'sum'}),
+    'monthly_levels': (['Month start', 'Attorney level'], {
+        'Billed hours': 'sum',
+        'Utilization rate': 'mean'
+    }),
+    'quarterly': ('Quarter start', {
+        'Billed hours': 'sum',
+        'Billed hours value': 'sum',
+        'Utilization rate': 'mean',
+        'Company name': 'nunique',
+        'Matter number': 'nunique'
+    }),
+})
+metrics['practices'] = dimension_metrics(['Practice area'])['Practice area']
+
 # Page Header
 st.title("Trending Analysis")
-st.markdown(f"*Last refreshed: Wednesday Feb 19, 2025*")
+st.markdown(f"*Last refreshed: {last_refreshed()}*")
 
 # Overall Performance Trends
 st.markdown("### Overall Performance Trends")
 
 # Create monthly trends dataframe
-monthly_trends = filtered_df.groupby(['Activity Year', 'Activity month']).agg({
-    'Billed hours': 'sum',
-    'Billed hours value': 'sum',
-    'Utilization rate': 'mean',
-    'Matter number': 'nunique',
-    'Company name': 'nunique'
-}).reset_index()
-
-# Fix date handling
-monthly_trends['Date'] = pd.to_datetime(
-    monthly_trends['Activity Year'].astype(int).astype(str) + '-' + 
-    monthly_trends['Activity month'].astype(int).astype(str).str.zfill(2) + '-01'
-)
+monthly_trends = metrics['monthly'].reset_index().rename(columns={'Month start': 'Date'})
 
 # Create subplot with multiple metrics
 fig = make_subplots(
@@ -98,9 +111,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # YoY Revenue Comparison
-    yearly_revenue = filtered_df.groupby('Activity Year').agg({
-        'Billed hours value': 'sum'
-    }).reset_index()
+    yearly_revenue = metrics['yearly'][['Billed hours value']].reset_index()
     
     fig_yoy_revenue = px.bar(
         yearly_revenue,
@@ -113,9 +124,7 @@ with col1:
 
 with col2:
     # YoY Utilization Comparison
-    yearly_util = filtered_df.groupby('Activity Year').agg({
-        'Utilization rate': 'mean'
-    }).reset_index()
+    yearly_util = metrics['yearly'][['Utilization rate']].reset_index()
     
     fig_yoy_util = px.bar(
         yearly_util,
@@ -130,17 +139,10 @@ with col2:
 st.markdown("### Practice Area Trends")
 
 # Create practice area trends
-practice_trends = filtered_df.groupby(['Activity Year', 'Activity month', 'Practice area']).agg({
-    'Billed hours value': 'sum'
-}).reset_index()
-
-practice_trends['Date'] = pd.to_datetime(
-    practice_trends['Activity Year'].astype(int).astype(str) + '-' + 
-    practice_trends['Activity month'].astype(int).astype(str).str.zfill(2) + '-01'
-)
+practice_trends = metrics['monthly_practices'].reset_index().rename(columns={'Month start': 'Date'})
 
 # Top 5 practice areas
-top_practices = filtered_df.groupby('Practice area')['Billed hours value'].sum().nlargest(5).index
+top_practices = top_n('practices', metrics['practices'], 'Billed hours value', 5).index
 
 practice_trends_filtered = practice_trends[practice_trends['Practice area'].isin(top_practices)]
 
@@ -158,15 +160,7 @@ st.plotly_chart(fig_practice_trends, use_container_width=True)
 st.markdown("### Attorney Level Trends")
 
 # Create attorney level trends
-level_trends = filtered_df.groupby(['Activity Year', 'Activity month', 'Attorney level']).agg({
-    'Billed hours': 'sum',
-    'Utilization rate': 'mean'
-}).reset_index()
-
-level_trends['Date'] = pd.to_datetime(
-    level_trends['Activity Year'].astype(int).astype(str) + '-' + 
-    level_trends['Activity month'].astype(int).astype(str).str.zfill(2) + '-01'
-)
+level_trends = metrics['monthly_levels'].reset_index().rename(columns={'Month start': 'Date'})
 
 col1, col2 = st.columns(2)
 
@@ -198,15 +192,7 @@ with col2:
 st.markdown("### Client Growth Analysis")
 
 # Monthly client metrics
-client_trends = filtered_df.groupby(['Activity Year', 'Activity month']).agg({
-    'Company name': 'nunique',
-    'Matter number': 'nunique'
-}).reset_index()
-
-client_trends['Date'] = pd.to_datetime(
-    client_trends['Activity Year'].astype(int).astype(str) + '-' + 
-    client_trends['Activity month'].astype(int).astype(str).str.zfill(2) + '-01'
-)
+client_trends = metrics['monthly'][['Company name', 'Matter number']].reset_index().rename(columns={'Month start': 'Date'})
 
 # Create subplot for client metrics
 fig_clients = make_subplots(
@@ -243,18 +229,12 @@ st.plotly_chart(fig_clients, use_container_width=True)
 # Quarterly Performance Table
 st.markdown("### Quarterly Performance Metrics")
 
-quarterly_metrics = filtered_df.groupby(['Activity Year', 'Activity quarter']).agg({
-    'Billed hours': 'sum',
-    'Billed hours value': 'sum',
-    'Utilization rate': 'mean',
-    'Company name': 'nunique',
-    'Matter number': 'nunique'
-}).round(2)
+quarterly_metrics = metrics['quarterly'].round(2)
 
 quarterly_metrics = quarterly_metrics.reset_index()
-quarterly_metrics['Quarter'] = quarterly_metrics.apply(
-    lambda x: f"Q{int(x['Activity quarter'])} {int(x['Activity Year'])}",
-    axis=1
+quarterly_metrics['Quarter'] = (
+    'Q' + quarterly_metrics['Quarter start'].dt.quarter.astype(str) + ' ' +
+    quarterly_metrics['Quarter start'].dt.year.astype(str)
 )
 
 # Format metrics
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from filter_index import select_rows
+from cube import rollup_cube
+
+# Windows a KPI can be compared against
+COMPARISON_MODES = ['previous', 'last_year']
+
+
+def comparison_window(start_date, end_date, mode):
+    # The prior period of the same length, ending the day before the current
+    # one starts, or the same dates one year earlier
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if mode == 'last_year':
+        return (start - pd.DateOffset(years=1)).date(), (end - pd.DateOffset(years=1)).date()
+    length = end - start + pd.Timedelta(days=1)
+    return (start - length).date(), (start - pd.Timedelta(days=1)).date()
+
+
+def window_rows(index, selections, windows):
+    # Row positions of each (start, end) window under the same selections.
+    # Each window is a binary search over the date-sorted rows; windows may
+    # overlap, so a row can count towards more than one
+    positions = []
+    for start, end in windows:
+        rows = select_rows(index, selections, start, end)
+        everything = np.arange(index['rows'])
+        positions.append(everything if rows is None else everything[rows])
+    return positions
+
+
+def compare_kpis(windows, kpis):
+    # KPI values per window, one column per window in the order given. Each
+    # window is a (cube, cell positions) pair; their cells are stacked and
+    # labelled once, then every KPI is rolled up by label over that single
+    # frame. A KPI is (func, column) with func one of sum/mean/nunique,
+    # ('ratio', (numerator, denominator)), ('per', column, dimension) for the
+    # average total per dimension value, or ('mean_per', column, dimension)
+    # for the average of its means
+    stacked = pd.concat([cube.iloc[rows] for cube, rows in windows], ignore_index=True)
+    stacked['Window'] = np.repeat(np.arange(len(windows)), [len(rows) for _, rows in windows])
+
+    values = {}
+    for name, (func, column, *by) in kpis.items():
+        if func == 'ratio':
+            sums = rollup_cube(stacked, 'Window', {column[0]: 'sum', column[1]: 'sum'})
+            values[name] = sums[column[0]] / sums[column[1]].replace(0, np.nan)
+        elif func == 'per':
+            present = rollup_cube(stacked[stacked[by[0]].notna()], 'Window', {column: 'sum', by[0]: 'nunique'})
+            values[name] = present[column] / present[by[0]]
+        elif func == 'mean_per':
+            means = rollup_cube(stacked, ['Window', by[0]], {column: 'mean'})[column]
+            values[name] = means.groupby(level='Window').mean()
+        else:
+            values[name] = rollup_cube(stacked, 'Window', {column: func})[column]
+    values = pd.DataFrame(values).reindex(range(len(windows)))
+    # Totals and counts of a window without rows are zero, as they are in pandas
+    for name, (func, *_) in kpis.items():
+        if func in ('sum', 'nunique'):
+            values[name] = values[name].fillna(0)
+    return values.T
+
+
+def kpi_delta(current, previous):
+    # st.metric delta text, or None when there is nothing to compare against
+    if pd.isna(current) or pd.isna(previous) or previous == 0:
+        return None
+    delta = ((current - previous) / previous) * 100
+    arrow = "↗️" if delta > 0 else "↘️"
+    return f"{arrow} {delta:.1f}%"
@@ -0,0 +1,198 @@
+import os
+import threading
+from datetime import timedelta
+import pandas as pd
+from data_store import (
+    SOURCE_CSV, DATASET_DIR, load_manifest, select_partitions, partition_path, generation_dir,
+    empty_frame, attach_levels,
+)
+
+# DuckDB and Polars are optional: without them every aggregation runs on pandas
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# Engine used until a session picks another one in the sidebar
+DEFAULT_BACKEND = os.environ.get('DASHBOARD_BACKEND', 'pandas')
+
+# Aggregation spec name -> SQL expression. Sums of no rows are 0 and
+# 'first' follows activity date order, as they are in pandas
+SQL_AGGREGATES = {
+    'sum': 'coalesce(sum({col}), 0)',
+    'mean': 'avg({col})',
+    'count': 'count({col})',
+    'nunique': 'count(DISTINCT {col})',
+    'std': 'stddev_samp({col})',
+    'min': 'min({col})',
+    'max': 'max({col})',
+    'first': 'first({col} ORDER BY "Activity date") FILTER (WHERE {col} IS NOT NULL)',
+    'size': 'count(*)',
+}
+
+# Aggregation spec name -> Polars expression, with the same null handling
+POLARS_AGGREGATES = {
+    'sum': lambda col: pl.col(col).sum(),
+    'mean': lambda col: pl.col(col).mean(),
+    'count': lambda col: pl.col(col).count(),
+    'nunique': lambda col: pl.col(col).drop_nulls().n_unique(),
+    'std': lambda col: pl.col(col).std(),
+    'min': lambda col: pl.col(col).min(),
+    'max': lambda col: pl.col(col).max(),
+    'first': lambda col: pl.col(col).drop_nulls().first(),
+    'size': lambda col: pl.len(),
+}
+
+_connections = threading.local()
+
+
+def available_backends():
+    backends = ['pandas']
+    if duckdb is not None:
+        backends.append('duckdb')
+    if pl is not None:
+        backends.append('polars')
+    return backends
+
+
+def aggregate_frame(df, group_by, measures, where=None):
+    # pandas engine: the filtered frame, narrowed by `where`, grouped once
+    for column, values in (where or {}).items():
+        df = df[df[column].isin(values)]
+    return df.groupby(group_by, observed=True).agg(measures)
+
+
+def measure_pairs(measures):
+    # (column, function) per output column. A list of functions for any
+    # column gives (column, function) headers, as pandas does
+    pairs = [
+        (col, func) for col, funcs in measures.items()
+        for func in (funcs if isinstance(funcs, list) else [funcs])
+    ]
+    nested = any(isinstance(funcs, list) for funcs in measures.values())
+    return pairs, nested
+
+
+def keyed_result(df, group_by, pairs, nested):
+    # Engine output (group keys, then m0, m1, ...) in groupby().agg() shape
+    result = df.set_index(group_by)
+    result.columns = pd.MultiIndex.from_tuples(pairs) if nested else [col for col, _ in pairs]
+    return result
+
+
+def partition_files(selections, start_date, end_date, source=SOURCE_CSV, root=DATASET_DIR):
+    # Stored partitions the period filters can match
+    manifest = load_manifest(source, root)
+    quarters = tuple(selections.get('Activity quarter') or ())
+    data_dir = generation_dir(manifest, root)
+    return [partition_path(key, data_dir) for key in select_partitions(manifest, start_date, end_date, quarters)]
+
+
+def empty_result(group_by, measures, roster, source=SOURCE_CSV, root=DATASET_DIR):
+    # What the pandas engine returns for a spec over no rows: the same keys
+    # and measures with the schema's types, so date keys stay datetimes
+    df = attach_levels(empty_frame(load_manifest(source, root)['categories']), roster)
+    return aggregate_frame(df, group_by, measures)
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _connection():
+    # In-process database, one connection per server thread. DuckDB scans
+    # the parquet files column by column on all cores
+    if not hasattr(_connections, 'con'):
+        _connections.con = duckdb.connect()
+    return _connections.con
+
+
+def duckdb_aggregate(selections, start_date, end_date, group_by, measures, roster,
+                     where=None, source=SOURCE_CSV, root=DATASET_DIR):
+    # DuckDB engine: the same filters and aggregation spec, run as one SQL
+    # query over the stored partitions instead of the loaded frame
+    keys = [group_by] if isinstance(group_by, str) else list(group_by)
+    files = partition_files(selections, start_date, end_date, source, root)
+    conditions, params = [f"{quote(key)} IS NOT NULL" for key in keys], []
+    if start_date and end_date:
+        conditions.append('"Activity date" >= ? AND "Activity date" < ?')
+        params += [pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1)]
+    for column, values in list(selections.items()) + list((where or {}).items()):
+        if len(values):
+            conditions.append(f"{quote(column)} IN ({', '.join('?' * len(values))})")
+            params += [v.item() if hasattr(v, 'item') else v for v in values]
+
+    pairs, nested = measure_pairs(measures)
+    columns = ', '.join(quote(key) for key in keys)
+    aggregates = ', '.join(
+        SQL_AGGREGATES[func].format(col=quote(col)) + f" AS m{i}" for i, (col, func) in enumerate(pairs)
+    )
+    sql = f"""
+        SELECT {columns}, {aggregates}
+        FROM (
+            SELECT t.*, r."Level" AS "Attorney level"
+            FROM read_parquet([{', '.join("'" + f.replace("'", "''") + "'" for f in files)}]) t
+            LEFT JOIN roster r ON t."User full name (first, last)" = r."Attorney"
+        )
+        WHERE {' AND '.join(conditions)}
+        GROUP BY {columns}
+        ORDER BY {columns}
+    """
+    if not files:
+        return empty_result(group_by, measures, roster, source, root)
+    con = _connection()
+    con.register('roster', roster.rename('Level').rename_axis('Attorney').reset_index())
+    return keyed_result(con.execute(sql, params).df(), group_by, pairs, nested)
+
+
+def polars_aggregate_many(selections, start_date, end_date, specs, roster,
+                          source=SOURCE_CSV, root=DATASET_DIR):
+    # Polars engine: every spec of a page becomes one branch of a single lazy
+    # plan over the stored partitions. Filters are pushed into the parquet
+    # scan, and collect_all runs the branches together so the shared scan,
+    # join and filter are computed once
+    files = partition_files(selections, start_date, end_date, source, root)
+    levels = pl.from_pandas(roster.rename('Attorney level').rename_axis('Attorney').reset_index()).lazy()
+    base = None
+    if files:
+        # Dimension columns are read as plain strings; each file has its own
+        # categorical dictionary
+        base = pl.scan_parquet(files).with_columns(pl.col(pl.Categorical).cast(pl.String)).join(
+            levels, left_on='User full name (first, last)', right_on='Attorney', how='left'
+        )
+        if start_date and end_date:
+            base = base.filter(
+                (pl.col('Activity date') >= pd.Timestamp(start_date).to_pydatetime()) &
+                (pl.col('Activity date') < (pd.Timestamp(end_date) + timedelta(days=1)).to_pydatetime())
+            )
+        for column, values in selections.items():
+            if len(values):
+                base = base.filter(pl.col(column).is_in(list(values)))
+
+    plans, shapes = [], {}
+    for name, (group_by, measures, *where) in specs.items():
+        keys = [group_by] if isinstance(group_by, str) else list(group_by)
+        pairs, nested = measure_pairs(measures)
+        shapes[name] = (group_by, measures, pairs, nested)
+        if base is None:
+            continue
+        plan = base.filter(pl.all_horizontal(pl.col(key).is_not_null() for key in keys))
+        for column, values in (where[0] if where and where[0] else {}).items():
+            plan = plan.filter(pl.col(column).is_in(list(values)))
+        plans.append(plan.group_by(keys).agg(
+            POLARS_AGGREGATES[func](col).alias(f"m{i}") for i, (col, func) in enumerate(pairs)
+        ).sort(keys))
+
+    frames = iter(pl.collect_all(plans)) if plans else iter(())
+    results = {}
+    for name, (group_by, measures, pairs, nested) in shapes.items():
+        if base is None:
+            results[name] = empty_result(group_by, measures, roster, source, root)
+        else:
+            results[name] = keyed_result(next(frames).to_pandas(), group_by, pairs, nested)
+    return results
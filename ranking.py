@@ -0,0 +1,18 @@
+import numpy as np
+
+
+def top_k_positions(values, k):
+    # Positions of the k largest values, largest first, by partial selection:
+    # argpartition finds them in linear time and only those k are sorted.
+    # Missing and infinite values (e.g. a rate over zero hours) are never
+    # ranked, and ties keep their original order, as with nlargest(keep='first')
+    values = np.asarray(values, dtype='float64')
+    valid = np.flatnonzero(np.isfinite(values))
+    k = min(k, len(valid))
+    if k == 0:
+        return valid
+    kth = values[valid[np.argpartition(-values[valid], k - 1)[k - 1]]]
+    # Everything tied with the k-th value competes for the last places
+    candidates = valid[values[valid] >= kth]
+    order = np.lexsort((candidates, -values[candidates]))
+    return candidates[order][:k]
@@ -0,0 +1,91 @@
+import os
+import json
+import threading
+from datetime import date
+from urllib.parse import urlencode, parse_qs
+from data_store import CACHE_DIR
+
+# Filter -> query parameter it is shared under
+LINK_PARAMS = {
+    'start_date': 'start',
+    'end_date': 'end',
+    'quarters': 'quarter',
+    'attorney_levels': 'level',
+    'attorneys': 'attorney',
+    'practices': 'practice',
+    'locations': 'location',
+    'statuses': 'status',
+    'clients': 'client',
+}
+
+# How often each shared filter state has been opened, kept across restarts
+LINKS_FILE = os.path.join(CACHE_DIR, "popular_links.json")
+_links_lock = threading.Lock()
+
+
+def encode_filters(filters, min_date, max_date):
+    # Query params for a filter state. Dates at the data bounds are left
+    # out, so a link keeps following the data as new weeks arrive
+    params = {}
+    for key, param in LINK_PARAMS.items():
+        value = filters[key]
+        if key == 'start_date':
+            if value and value != min_date:
+                params[param] = [value.isoformat()]
+        elif key == 'end_date':
+            if value and value != max_date:
+                params[param] = [value.isoformat()]
+        elif value:
+            params[param] = sorted(str(v) for v in value)
+    return params
+
+
+def decode_filters(params):
+    # Filter values from query params; each param maps to a list of strings.
+    # Malformed dates are ignored rather than failing the page
+    filters = {}
+    for key, param in LINK_PARAMS.items():
+        values = params.get(param)
+        if not values:
+            continue
+        if key in ('start_date', 'end_date'):
+            try:
+                filters[key] = date.fromisoformat(values[0])
+            except ValueError:
+                pass
+        else:
+            filters[key] = list(values)
+    return filters
+
+
+def link_id(params):
+    return urlencode(sorted(params.items()), doseq=True)
+
+
+def _read_links():
+    if not os.path.exists(LINKS_FILE):
+        return {}
+    with open(LINKS_FILE) as f:
+        return json.load(f)
+
+
+def record_link(params):
+    # Count one more opening of this filter state
+    if not params:
+        return
+    with _links_lock:
+        links = _read_links()
+        key = link_id(params)
+        links[key] = links.get(key, 0) + 1
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(LINKS_FILE + ".tmp", 'w') as f:
+            json.dump(links, f)
+        os.replace(LINKS_FILE + ".tmp", LINKS_FILE)
+
+
+def popular_links(limit):
+    # The most opened filter states, most popular first
+    with _links_lock:
+        links = _read_links()
+    ranked = sorted(links.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [parse_qs(key) for key, _ in ranked]
@@ -0,0 +1,31 @@
+import numpy as np
+
+# Exact distinct-count sketches: the sorted category codes a group of rows
+# holds. Codes are stable across incremental refreshes (new values are
+# appended to the dictionary), so sets stored for different months can be
+# merged without translating them
+
+
+def code_sets(group_ids, codes, groups):
+    # Sorted distinct non-missing codes per group, as one int32 array each.
+    # `group_ids` numbers each row's group from 0 to groups - 1
+    present = codes >= 0
+    stride = np.int64(codes.max() + 1) if present.any() else np.int64(1)
+    pairs = np.unique(group_ids[present].astype(np.int64) * stride + codes[present])
+    bounds = np.searchsorted(pairs // stride, np.arange(groups + 1))
+    values = (pairs % stride).astype(np.int32)
+    return [values[bounds[i]:bounds[i + 1]] for i in range(groups)]
+
+
+def distinct_counts(group_ids, sets, groups):
+    # Merge the code sets of every row into its group and count the distinct
+    # codes per group. Rows with a negative group id belong to no group
+    lengths = np.fromiter((len(s) for s in sets), dtype=np.int64, count=len(sets))
+    if not lengths.sum():
+        return np.zeros(groups, dtype=np.int64)
+    codes = np.concatenate([np.asarray(s, dtype=np.int64) for s in sets])
+    ids = np.repeat(np.asarray(group_ids, dtype=np.int64), lengths)
+    keep = ids >= 0
+    stride = codes.max() + 1
+    pairs = np.unique(ids[keep] * stride + codes[keep])
+    return np.bincount(pairs // stride, minlength=groups)